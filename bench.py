@@ -0,0 +1,211 @@
+# File: bench.py
+# Đo hiệu năng lặp lại được cho từng giai đoạn của pipeline trên bãi đỗ tổng hợp, ghi kết
+# quả ra JSON và so sánh với baseline đã lưu để phát hiện hồi quy.
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+import yaml
+
+from src.parking_manager import ParkingManager
+from src.slot_detector import SlotDetector
+from src.slot_layout import SlotLayout
+from src.synthetic_lot import SyntheticLot
+from src.visualizer import Visualizer
+
+
+def load_config(config_path):
+    with open(config_path, 'r', encoding='utf-8') as file:
+        config = yaml.safe_load(file)
+    # Benchmark không được ghi trạng thái ra đĩa
+    config['state_persistence'] = {'enabled': False}
+    return config
+
+
+def parse_resolution(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def measure(fn, repeats, warmup):
+    """
+    Chạy `fn` nhiều lần và trả về thống kê thời gian (ms) cùng bộ nhớ cấp phát đỉnh (KB)
+    của một lần chạy. tracemalloc chỉ thấy bộ nhớ cấp phát qua Python/numpy, không thấy
+    bộ nhớ bên trong OpenCV.
+    """
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    p25, median, p75 = np.percentile(np.array(times) * 1000, [25, 50, 75])
+    return {
+        'median_ms': float(median),
+        'iqr_ms': float(p75 - p25),
+        'min_ms': float(min(times) * 1000),
+        'repeats': repeats,
+        'alloc_peak_kb': peak / 1024,
+    }
+
+
+def make_lot(num_slots, resolution, num_frames=4):
+    """Bãi đỗ tổng hợp cùng vài khung hình đầu tiên, None nếu không xếp đủ ô."""
+    try:
+        lot = SyntheticLot(num_slots, resolution, seed=0)
+    except ValueError:
+        return None, []
+    return lot, [frame for frame, _ in lot.frames(num_frames)]
+
+
+def frame_cases(config, resolution, detector_slots):
+    """Các trường hợp chỉ phụ thuộc độ phân giải: tiền xử lý, các bước của SlotDetector, bảng UI."""
+    name = f"{resolution[0]}x{resolution[1]}"
+    lot, frames = make_lot(detector_slots, resolution)
+    if lot is None:
+        return
+    frame = frames[0]
+    manager = ParkingManager(SlotLayout(lot.slots, resolution), config)
+    yield f"preprocess_frame/{name}", lambda: manager._preprocess_frame(frame)
+
+    detector = SlotDetector(config)
+    edges = detector._preprocess_frame_for_lines(frame)
+    lines = detector._detect_lines(edges)
+    yield f"detector.preprocess/{name}", lambda: detector._preprocess_frame_for_lines(frame)
+    yield f"detector.lines/{name}", lambda: detector._detect_lines(edges)
+    if lines is not None:
+        vertical, horizontal = detector._classify_lines(lines)
+        yield f"detector.classify/{name}", lambda: detector._classify_lines(lines)
+        yield f"detector.merge/{name}", lambda: (detector._merge_lines(vertical, 'vertical', detector.merge_dist_thresh),
+                                                 detector._merge_lines(horizontal, 'horizontal', detector.merge_dist_thresh))
+        merged = detector._find_merged_lines(frame)
+        if merged is not None:
+            yield f"detector.slots/{name}", lambda: detector._find_slots_from_intersections(*merged)
+    yield f"detector.total/{name}", lambda: detector.detect_in_frame(frame, verbose=False)
+
+    visualizer = Visualizer(config.get('occupancy_params', {}))
+    canvas = frame.copy()
+    yield f"draw_ui_panel/{name}", lambda: visualizer.draw_ui_panel(canvas, 7, detector_slots, 30.0)
+
+
+def slot_cases(config, resolution, num_slots):
+    """Các trường hợp phụ thuộc số ô: update_statuses, draw_slots, NMS."""
+    name = f"{resolution[0]}x{resolution[1]}/n{num_slots}"
+    lot, frames = make_lot(num_slots, resolution)
+    if lot is None:
+        print(f"[WARNING] Không xếp được {num_slots} ô ở {resolution[0]}x{resolution[1]}, bỏ qua.")
+        return
+    manager = ParkingManager(SlotLayout(lot.slots, resolution), config)
+    cycle = itertools.count()
+    yield f"update_statuses/{name}", lambda: manager.update_statuses(frames[next(cycle) % len(frames)])
+
+    visualizer = Visualizer(config.get('occupancy_params', {}))
+    statuses = list(~lot.occupied)
+    canvas = frames[0].copy()
+    yield f"draw_slots/{name}", lambda: visualizer.draw_slots(canvas, manager.slots, statuses)
+
+    # Mỗi ô thật kèm hai bản sao lệch vài điểm ảnh, giống đầu ra thô của bước tìm ô
+    rng = np.random.default_rng(0)
+    boxes = np.array(lot.slots * 3, dtype=np.float64)
+    boxes[len(lot.slots):] += rng.integers(-3, 4, (2 * len(lot.slots), 4))
+    detector = SlotDetector(config)
+    yield f"nms/n{num_slots}", lambda: detector._non_max_suppression(boxes, 0.3)
+
+
+def compare(results, baseline, tolerance):
+    """Trả về danh sách (tên, median hiện tại, median baseline, tỉ lệ) của các mục bị chậm đi."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None or base['median_ms'] <= 0:
+            continue
+        ratio = result['median_ms'] / base['median_ms']
+        result['baseline_ms'] = base['median_ms']
+        result['change'] = ratio - 1
+        if ratio > 1 + tolerance:
+            regressions.append((name, result['median_ms'], base['median_ms'], ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark từng giai đoạn của pipeline bãi đỗ xe.")
+    parser.add_argument('--config', default="config/config.yaml")
+    parser.add_argument('--resolutions', nargs='+', default=['1280x720', '1920x1080'])
+    parser.add_argument('--slots', nargs='+', type=int, default=[100, 1000])
+    parser.add_argument('--detector-slots', type=int, default=60,
+                        help="Số ô của bãi dùng cho các bước SlotDetector")
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--filter', default=None, help="Chỉ chạy các mục có tên chứa chuỗi này")
+    parser.add_argument('--output', default="data/bench/latest.json")
+    parser.add_argument('--baseline', default="data/bench/baseline.json")
+    parser.add_argument('--save-baseline', action='store_true', help="Ghi kết quả lần này làm baseline")
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help="Mức chậm đi cho phép so với baseline (0.15 = 15%%)")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    resolutions = [parse_resolution(r) for r in args.resolutions]
+
+    def all_cases():
+        for resolution in resolutions:
+            yield from frame_cases(config, resolution, args.detector_slots)
+            for num_slots in args.slots:
+                yield from slot_cases(config, resolution, num_slots)
+
+    results = {}
+    print(f"{'benchmark':<42}{'median ms':>11}{'iqr ms':>9}{'alloc KB':>10}")
+    for name, fn in all_cases():
+        if (args.filter and args.filter not in name) or name in results:
+            continue
+        results[name] = measure(fn, args.repeats, args.warmup)
+        r = results[name]
+        print(f"{name:<42}{r['median_ms']:>11.3f}{r['iqr_ms']:>9.3f}{r['alloc_peak_kb']:>10.0f}")
+
+    regressions = []
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            regressions = compare(results, json.load(f)['results'], args.tolerance)
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'opencv_threads': cv2.getNumThreads(),
+            'repeats': args.repeats,
+        },
+        'results': results,
+    }
+    for path in [args.output] + ([args.baseline] if args.save_baseline else []):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+    print(f"[*] Đã ghi kết quả vào '{args.output}'" + (f" và baseline '{args.baseline}'." if args.save_baseline else "."))
+
+    if regressions:
+        print(f"[!] {len(regressions)} mục chậm hơn baseline quá {args.tolerance:.0%}:")
+        for name, current, base, ratio in regressions:
+            print(f"    {name}: {current:.3f} ms (baseline {base:.3f} ms, x{ratio:.2f})")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+# File: check_mjpeg_server.py
+# Kiểm tra nhanh máy chủ xem trước MJPEG trên localhost (không cần video hay màn hình):
+# khởi động trên cổng bất kỳ, lấy /snapshot.jpg, đọc một khung hình của /stream, kiểm
+# tra rằng người xem mới không nhận lại JPEG cũ đã lưu và số người xem trở về 0.
+#
+#   python check_mjpeg_server.py
+import http.client
+import sys
+import threading
+import time
+
+import numpy as np
+
+from src.mjpeg_server import BOUNDARY, MjpegServer
+
+FRAME_SIZE = (320, 240)
+SLOTS = [[40, 120, 100, 220], [120, 120, 180, 220]]
+
+
+class Publisher:
+    """Luồng nền gửi khung hình tổng hợp cho máy chủ, mỗi khung hình một nội dung khác."""
+
+    def __init__(self, server, fps=30):
+        self.server = server
+        self.period = 1.0 / fps
+        self.running = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="publisher", daemon=True)
+
+    def start(self):
+        self.running.set()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped = True
+        self.running.set()
+        self._thread.join()
+
+    def _run(self):
+        count = 0
+        while not self._stopped:
+            self.running.wait()
+            count += 1
+            frame = np.full((FRAME_SIZE[1], FRAME_SIZE[0], 3), 64, dtype=np.uint8)
+            # Khối sáng dịch chuyển theo số thứ tự để JPEG của mỗi khung hình khác nhau
+            x = 10 + count % (FRAME_SIZE[0] - 40)
+            frame[10:40, x:x + 30] = 255
+            self.server.publish(frame, SLOTS, [True, count % 2 == 0], 1, len(SLOTS), 30.0)
+            time.sleep(self.period)
+
+
+def read_multipart_frame(response):
+    """Đọc một phần JPEG của luồng multipart; trả về bytes của ảnh."""
+    line = response.readline()
+    while line.strip() != f"--{BOUNDARY}".encode('ascii'):
+        if not line:
+            raise ValueError("luồng kết thúc trước khi có khung hình")
+        line = response.readline()
+    headers = {}
+    for line in iter(response.readline, b"\r\n"):
+        name, _, value = line.decode('ascii').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if headers.get('content-type') != 'image/jpeg':
+        raise ValueError(f"Content-Type không phải image/jpeg: {headers.get('content-type')}")
+    return response.read(int(headers['content-length']))
+
+
+def wait_for(predicate, timeout):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def main():
+    server = MjpegServer({'preview_server': {'host': "127.0.0.1", 'port': 0, 'fps': 30}}).start()
+    publisher = Publisher(server).start()
+    host, port = server.address[:2]
+    failures = []
+    try:
+        connection = http.client.HTTPConnection(host, port, timeout=10)
+        connection.request('GET', '/snapshot.jpg')
+        response = connection.getresponse()
+        snapshot = response.read()
+        connection.close()
+        if response.status != 200 or not snapshot.startswith(b"\xff\xd8"):
+            failures.append(f"/snapshot.jpg trả về {response.status}, {len(snapshot)} byte")
+        print(f"[*] /snapshot.jpg: {response.status}, {len(snapshot)} byte")
+
+        # Không còn ai xem nên không có khung hình mới; người xem mới phải chờ khung hình
+        # kế tiếp chứ không nhận lại bản đã lưu ở trên
+        if not wait_for(lambda: server.clients == 0, 5.0):
+            failures.append(f"sau /snapshot.jpg còn {server.clients} người xem")
+        publisher.running.clear()
+        connection = http.client.HTTPConnection(host, port, timeout=10)
+        connection.request('GET', '/stream')
+        response = connection.getresponse()
+        if not wait_for(lambda: server.clients == 1, 5.0):
+            failures.append(f"khi đang xem /stream có {server.clients} người xem (cần 1)")
+        publisher.running.set()
+        frame = read_multipart_frame(response)
+        response.close()
+        connection.close()
+        if not frame.startswith(b"\xff\xd8"):
+            failures.append("khung hình đầu tiên của /stream không phải JPEG")
+        if frame == snapshot:
+            failures.append("khung hình đầu tiên của /stream là JPEG cũ đã lưu từ /snapshot.jpg")
+        print(f"[*] /stream: nhận một khung hình {len(frame)} byte")
+
+        # Máy chủ chỉ nhận ra người xem đã ngắt khi ghi khung hình kế tiếp thất bại
+        if not wait_for(lambda: server.clients == 0, 5.0):
+            failures.append(f"sau khi ngắt /stream còn {server.clients} người xem")
+        print(f"[*] Số người xem sau khi ngắt kết nối: {server.clients}")
+    finally:
+        publisher.stop()
+        server.stop()
+
+    for failure in failures:
+        print(f"[!] {failure}")
+    if failures:
+        sys.exit(1)
+    print("[*] Máy chủ MJPEG hoạt động đúng.")
+
+
+if __name__ == '__main__':
+    main()
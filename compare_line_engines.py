@@ -0,0 +1,117 @@
+# File: compare_line_engines.py
+# So sánh tốc độ và độ chính xác giữa các bộ tìm đoạn thẳng của SlotDetector.
+import argparse
+import copy
+import json
+import time
+
+import cv2
+import numpy as np
+import yaml
+
+from src.detection_eval import match_score
+from src.slot_detector import SlotDetector
+from src.slot_layout import SlotLayout
+
+
+def load_config(config_path):
+    with open(config_path, 'r', encoding='utf-8') as file:
+        return yaml.safe_load(file)
+
+
+def read_frames(video_source, num_frames):
+    """Đọc `num_frames` khung hình trải đều trong video."""
+    cap = cv2.VideoCapture(video_source)
+    if not cap.isOpened():
+        raise IOError(f"Không thể mở video '{video_source}'")
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or 1
+    frames = []
+    for index in np.linspace(0, total - 1, num_frames).astype(int):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, int(index))
+        ret, frame = cap.read()
+        if ret:
+            frames.append(frame)
+    cap.release()
+    return frames
+
+
+def benchmark_engine(config, engine, frames, reference, repeats):
+    engine_config = copy.deepcopy(config)
+    engine_config.setdefault('detection_params', {})['line_engine'] = engine
+    detector = SlotDetector(engine_config)
+
+    line_times, total_times = [], []
+    num_vertical, num_horizontal, num_slots = [], [], []
+    precisions, recalls = [], []
+    for frame in frames:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            edges = detector._preprocess_frame_for_lines(frame)
+            lines = detector._detect_lines(edges)
+            line_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        slots = detector.detect_in_frame(frame, verbose=False)
+        total_times.append(time.perf_counter() - start)
+
+        vertical, horizontal = detector._classify_lines(lines) if lines is not None else ([], [])
+        num_vertical.append(len(vertical))
+        num_horizontal.append(len(horizontal))
+        num_slots.append(len(slots))
+        if reference:
+            precision, recall = match_score(slots, reference)
+            precisions.append(precision)
+            recalls.append(recall)
+
+    return {
+        'engine': engine,
+        'lines_ms': 1000 * float(np.median(line_times)),
+        'detect_ms': 1000 * float(np.median(total_times)),
+        'vertical': float(np.mean(num_vertical)),
+        'horizontal': float(np.mean(num_horizontal)),
+        'slots': float(np.mean(num_slots)),
+        'precision': float(np.mean(precisions)) if precisions else None,
+        'recall': float(np.mean(recalls)) if recalls else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh các bộ tìm đoạn thẳng của SlotDetector.")
+    parser.add_argument('--config', default="config/config.yaml")
+    parser.add_argument('--engines', nargs='+', default=['hough', 'morphology', 'lsd'])
+    parser.add_argument('--frames', type=int, default=3, help="Số khung hình lấy mẫu từ video")
+    parser.add_argument('--repeats', type=int, default=5, help="Số lần đo cho mỗi khung hình")
+    parser.add_argument('--reference', default=None,
+                        help="File JSON bố cục tham chiếu (mặc định: slots_data_path)")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    frames = read_frames(config['video_source'], args.frames)
+    if not frames:
+        print("Không thể đọc video")
+        return
+
+    reference_path = args.reference or config.get('slots_data_path')
+    reference = []
+    if reference_path:
+        try:
+            with open(reference_path, 'r') as f:
+                slots, reference_size = SlotLayout.parse_json(json.load(f))
+            # Co giãn bố cục tham chiếu về độ phân giải của video
+            frame_size = (frames[0].shape[1], frames[0].shape[0])
+            reference = SlotLayout(slots, frame_size, reference_size).slots
+        except FileNotFoundError:
+            print(f"[WARNING] Không tìm thấy bố cục tham chiếu '{reference_path}', bỏ qua độ chính xác.")
+
+    print(f"{'engine':<12}{'lines ms':>10}{'detect ms':>11}{'vert':>8}{'horiz':>8}"
+          f"{'slots':>8}{'prec':>8}{'recall':>8}")
+    for engine in args.engines:
+        r = benchmark_engine(config, engine, frames, reference, args.repeats)
+        precision = f"{r['precision']:.2f}" if r['precision'] is not None else '-'
+        recall = f"{r['recall']:.2f}" if r['recall'] is not None else '-'
+        print(f"{r['engine']:<12}{r['lines_ms']:>10.1f}{r['detect_ms']:>11.1f}{r['vertical']:>8.0f}"
+              f"{r['horizontal']:>8.0f}{r['slots']:>8.0f}{precision:>8}{recall:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+# File: evaluate_detector.py
+# Đánh giá độ chính xác và tốc độ của SlotDetector so với bố cục tham chiếu, cho nhiều
+# bộ tìm đoạn thẳng / bộ tham số trong cùng một lần chạy.
+import argparse
+import copy
+import json
+import os
+import time
+
+import numpy as np
+import yaml
+
+from compare_line_engines import read_frames
+from src.detection_eval import StageTimer, evaluate_slots
+from src.slot_detector import SlotDetector
+from src.slot_layout import SlotLayout
+from src.synthetic_lot import SyntheticLot
+
+
+def load_config(config_path):
+    with open(config_path, 'r', encoding='utf-8') as file:
+        return yaml.safe_load(file)
+
+
+def parse_variant(text):
+    """
+    Phân tích một biến thể dạng 'tên:khóa=giá_trị,khóa=giá_trị'. Khóa là đường dẫn trong
+    detection_params (dùng dấu chấm cho khóa lồng, ví dụ pyramid_levels=1); giá trị
+    được đọc như YAML.
+    """
+    name, _, assignments = text.partition(':')
+    overrides = {}
+    for item in filter(None, assignments.split(',')):
+        key, sep, value = item.partition('=')
+        if not sep:
+            raise argparse.ArgumentTypeError(f"Biến thể không hợp lệ '{text}': thiếu '=' trong '{item}'")
+        overrides[key.strip()] = yaml.safe_load(value)
+    return name.strip(), overrides
+
+
+def apply_overrides(config, overrides):
+    variant_config = copy.deepcopy(config)
+    for key, value in overrides.items():
+        target = variant_config.setdefault('detection_params', {})
+        *parents, leaf = key.split('.')
+        for part in parents:
+            target = target.setdefault(part, {})
+        target[leaf] = value
+    return variant_config
+
+
+def load_inputs(args, config):
+    """Khung hình và bố cục tham chiếu: từ bãi đỗ tổng hợp hoặc từ video + file bố cục."""
+    if args.synthetic:
+        width, height = (int(v) for v in args.resolution.lower().split('x'))
+        lot = SyntheticLot(args.synthetic, (width, height), seed=args.seed)
+        frames = [frame for frame, _ in lot.frames(args.frames)]
+        return frames, lot.slots, f"synthetic {args.synthetic} ô {width}x{height} (seed {args.seed})"
+
+    frames = read_frames(args.video or config['video_source'], args.frames)
+    if not frames:
+        raise IOError("Không thể đọc khung hình từ video")
+    reference_path = args.reference or config['slots_data_path']
+    with open(reference_path, 'r') as f:
+        slots, reference_size = SlotLayout.parse_json(json.load(f))
+    frame_size = (frames[0].shape[1], frames[0].shape[0])
+    return frames, SlotLayout(slots, frame_size, reference_size).slots, reference_path
+
+
+def evaluate_variant(config, frames, reference, iou_thresh):
+    detector = SlotDetector(config)
+    timer = StageTimer(detector)
+    metrics, totals, stage_times = [], [], {}
+    for frame in frames:
+        start = time.perf_counter()
+        slots = detector.detect_in_frame(frame, verbose=False)
+        totals.append(time.perf_counter() - start)
+        for stage, seconds in timer.reset().items():
+            stage_times.setdefault(stage, []).append(seconds)
+        metrics.append(evaluate_slots(slots, reference, iou_thresh))
+
+    summary = {key: float(np.mean([m[key] for m in metrics]))
+               for key in ('predicted', 'matched', 'precision', 'recall', 'f1', 'mean_iou')}
+    summary['total_ms'] = 1000 * float(np.median(totals))
+    summary['stages_ms'] = {stage: 1000 * float(np.median(times)) for stage, times in stage_times.items()}
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Đánh giá độ chính xác và tốc độ của SlotDetector.")
+    parser.add_argument('--config', default="config/config.yaml")
+    parser.add_argument('--video', default=None, help="Video nguồn (mặc định: video_source)")
+    parser.add_argument('--reference', default=None, help="File bố cục tham chiếu (mặc định: slots_data_path)")
+    parser.add_argument('--synthetic', type=int, default=None,
+                        help="Dùng bãi đỗ tổng hợp với số ô này thay cho video + bố cục")
+    parser.add_argument('--resolution', default="1920x1080", help="Độ phân giải của bãi đỗ tổng hợp")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--frames', type=int, default=3, help="Số khung hình đánh giá")
+    parser.add_argument('--engines', nargs='*', default=[], help="Thêm một biến thể cho mỗi line_engine")
+    parser.add_argument('--variant', action='append', type=parse_variant, default=[],
+                        help="Biến thể tham số 'tên:khóa=giá_trị,...' (lặp lại được)")
+    parser.add_argument('--iou', type=float, default=0.5, help="Ngưỡng IoU để ghép ô")
+    parser.add_argument('--output', default=None, help="Ghi kết quả chi tiết ra file JSON")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    frames, reference, source = load_inputs(args, config)
+    variants = [('config', {})] + [(engine, {'line_engine': engine}) for engine in args.engines] + args.variant
+    print(f"[*] Đánh giá trên {len(frames)} khung hình, {len(reference)} ô tham chiếu ({source}).")
+
+    results = {}
+    print(f"{'variant':<16}{'slots':>7}{'prec':>7}{'recall':>8}{'f1':>7}{'mIoU':>7}{'total ms':>10}  stages ms")
+    for name, overrides in variants:
+        r = evaluate_variant(apply_overrides(config, overrides), frames, reference, args.iou)
+        results[name] = dict(r, overrides=overrides)
+        stages = ', '.join(f"{stage.strip('_')} {ms:.1f}" for stage, ms in r['stages_ms'].items())
+        print(f"{name:<16}{r['predicted']:>7.0f}{r['precision']:>7.2f}{r['recall']:>8.2f}{r['f1']:>7.2f}"
+              f"{r['mean_iou']:>7.2f}{r['total_ms']:>10.1f}  {stages}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump({'source': source, 'frames': len(frames), 'reference_slots': len(reference),
+                       'iou_thresh': args.iou, 'results': results}, f, indent=2)
+        print(f"[*] Đã ghi kết quả vào '{args.output}'.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+# File: golden.py
+# Ghi lại kết quả phân tích trạng thái của từng khung hình (file golden) và kiểm tra lại
+# rằng ParkingManager hiện tại cho đúng kết quả đó sau khi tối ưu/refactor.
+#
+#   python golden.py record                # ghi data/golden/<tên video>.golden.npz
+#   python golden.py check                 # chạy lại và báo khung hình/ô khác biệt đầu tiên
+import argparse
+import json
+import os
+import sys
+
+import cv2
+import yaml
+
+from src.golden import check_golden, record_golden
+from src.slot_layout import SlotLayout
+
+
+def load_config(config_path):
+    with open(config_path, 'r', encoding='utf-8') as file:
+        return yaml.safe_load(file)
+
+
+def load_layout(path, video_source):
+    """Bố cục ô co giãn theo độ phân giải video (không ghi file nhị phân đi kèm)."""
+    cap = cv2.VideoCapture(video_source)
+    frame_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    cap.release()
+    with open(path, 'r') as f:
+        slots, reference_size = SlotLayout.parse_json(json.load(f))
+    return SlotLayout(slots, frame_size, reference_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ghi/kiểm tra file golden cho kết quả của ParkingManager.")
+    parser.add_argument('command', choices=['record', 'check'])
+    parser.add_argument('--config', default="config/config.yaml")
+    parser.add_argument('--video', default=None, help="Video nguồn (mặc định: video_source)")
+    parser.add_argument('--slots', default=None, help="File bố cục ô (mặc định: slots_data_path)")
+    parser.add_argument('--golden', default=None,
+                        help="File golden (mặc định: data/golden/<tên video>.golden.npz)")
+    parser.add_argument('--frames', type=int, default=None, help="Số khung hình tối đa khi ghi")
+    parser.add_argument('--ratio-tol', type=float, default=0.0,
+                        help="Sai lệch tỷ lệ cho phép khi kiểm tra (sau khi làm tròn float16)")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    video_source = args.video or config['video_source']
+    layout = load_layout(args.slots or config['slots_data_path'], video_source)
+    golden_path = args.golden or os.path.join(
+        "data", "golden", os.path.splitext(os.path.basename(video_source))[0] + ".golden.npz")
+
+    if args.command == 'record':
+        frames = record_golden(golden_path, video_source, config, layout, args.frames)
+        size_kb = os.path.getsize(golden_path) / 1024
+        print(f"[*] Đã ghi {frames} khung hình x {len(layout)} ô vào '{golden_path}' ({size_kb:.1f} KB).")
+        return
+
+    result = check_golden(golden_path, video_source, config, layout, args.ratio_tol)
+    for warning in result['warnings']:
+        print(f"[WARNING] {warning}")
+    divergence = result['divergence']
+    if divergence is None:
+        print(f"[*] Khớp với file golden trên {result['frames']} khung hình.")
+        return
+    print(f"[!] Khác biệt đầu tiên ở khung hình {divergence['frame']}, ô {divergence['slot']} "
+          f"({divergence['kind']}): golden {divergence['expected']}, hiện tại {divergence['actual']} "
+          f"({divergence['slots_differing']} ô khác biệt trong khung hình này).")
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,84 +1,239 @@
 import cv2
 import yaml
 import os
+import time
+import signal
+import threading
 from src.slot_detector import SlotDetector
 from src.parking_manager import ParkingManager
 from src.visualizer import Visualizer
+from src.display import DisplayThread
+from src.recorder import VideoRecorder
+from src.mjpeg_server import MjpegServer
+from src.instrumentation import Instrumentation
+from src.tracing import Tracer
+from src.watchdog import ProfilingWatchdog
+from src.slot_layout import SlotLayout
+from src.hot_reload import FileWatcher
+from src.detection_cache import DetectionCache, params_digest, video_fingerprint
 
-def load_config(config_path="config/config.yaml"):
+CONFIG_PATH = "config/config.yaml"
+
+def load_config(config_path=CONFIG_PATH):
     """Tải file cấu hình từ đường dẫn được chỉ định."""
     with open(config_path, 'r', encoding='utf-8') as file:
         return yaml.safe_load(file)
 
+def detect_layout(config, video_source, frame_size, timings):
+    """
+    Phát hiện bố cục ô tự động, dùng lại kết quả trong bộ đệm nếu cùng video (theo dấu
+    vân tay) và cùng tham số phát hiện.
+    
+    Returns:
+        SlotLayout, hoặc None nếu không phát hiện được ô nào
+    """
+    cache_params = config.get('detection_cache', {}) or {}
+    cache = None
+    if cache_params.get('enabled', True):
+        start = time.perf_counter()
+        fingerprint = video_fingerprint(video_source, cache_params.get('samples', 4),
+                                        cache_params.get('sample_stride', 3))
+        params_key = params_digest(config.get('detection_params', {}))
+        timings['fingerprint'] = time.perf_counter() - start
+        if fingerprint is not None:
+            cache = DetectionCache(cache_params.get('dir', "data/cache/detections"))
+            cached = cache.get(fingerprint, params_key)
+            if cached is not None:
+                slots, reference_size = SlotLayout.parse_json(cached)
+                if slots:
+                    print("[*] Dùng lại kết quả phát hiện từ bộ đệm.")
+                    return SlotLayout(slots, frame_size, reference_size)
+    
+    start = time.perf_counter()
+    parking_slots = SlotDetector(config).detect(video_source)
+    timings['detect'] = time.perf_counter() - start
+    if not parking_slots:
+        return None
+    
+    layout = SlotLayout(parking_slots, frame_size)
+    if cache is not None:
+        try:
+            cache.put(fingerprint, params_key, layout.to_json())
+        except OSError as e:
+            print(f"[WARNING] Không thể ghi bộ đệm phát hiện: {e}")
+    return layout
+
+def validate_reloaded_config(config):
+    """
+    Kiểm tra các khóa mà vòng lặp chính cần trước khi hoán đổi sang cấu hình mới.
+    
+    Raises:
+        ValueError: Nếu cấu hình không phải một bảng hoặc thiếu / sai kiểu khóa bắt buộc
+    """
+    if not isinstance(config, dict):
+        raise ValueError("file cấu hình không chứa một bảng khóa/giá trị")
+    slots_data_path = config.get('slots_data_path')
+    if not isinstance(slots_data_path, str) or not slots_data_path:
+        raise ValueError("thiếu 'slots_data_path' hoặc không phải đường dẫn")
+    if not isinstance(config.get('occupancy_params', {}), dict):
+        raise ValueError("'occupancy_params' phải là một bảng khóa/giá trị")
+
+def apply_reload(changed, config, parking_manager, sinks, watcher, frame_size):
+    """
+    Nạp lại cấu hình và/hoặc bố cục ô đã thay đổi rồi hoán đổi vào giữa hai khung hình.
+    Nếu file mới bị lỗi (ví dụ đang được ghi dở hoặc thiếu khóa bắt buộc) thì giữ nguyên
+    trạng thái cũ; cấu hình chỉ được áp dụng sau khi đã qua kiểm tra.
+    
+    Returns:
+        Cấu hình đang có hiệu lực
+    """
+    if CONFIG_PATH in changed:
+        try:
+            new_config = load_config()
+            validate_reloaded_config(new_config)
+            parking_manager.set_params(new_config.get('occupancy_params', {}))
+            for sink in sinks:
+                sink.set_params(new_config)
+            if new_config.get('slots_data_path') != config.get('slots_data_path'):
+                watcher.watch(new_config['slots_data_path'])
+                changed = changed | {new_config['slots_data_path']}
+            config = new_config
+            print("[*] Đã nạp lại tham số xác định trạng thái từ file cấu hình.")
+        except (OSError, yaml.YAMLError, ValueError) as e:
+            print(f"[WARNING] Không thể nạp lại cấu hình, giữ cấu hình cũ: {e}")
+    
+    if config['slots_data_path'] in changed:
+        try:
+            layout = SlotLayout.load(config['slots_data_path'], frame_size)
+        except (OSError, ValueError) as e:
+            print(f"[WARNING] Không thể nạp lại bố cục ô đỗ: {e}")
+            layout = None
+        if layout is not None:
+            carried = parking_manager.set_layout(layout)
+            print(f"[*] Đã nạp lại {len(layout)} ô đỗ xe ({carried} ô giữ nguyên trạng thái).")
+    return config
+
 def main():
+    # Thời gian của từng giai đoạn khởi động
+    timings = {}
+    start = time.perf_counter()
+    
     # Đọc cấu hình
     config = load_config()
+    timings['config'] = time.perf_counter() - start
     video_source = config['video_source']
     slots_data_path = config['slots_data_path']
     
-    # Kiểm tra tọa độ ô đỗ xe
-    slot_detector = SlotDetector(config)
-    parking_slots = slot_detector.load_slots(slots_data_path)
+    # Mở video nguồn
+    phase_start = time.perf_counter()
+    cap = cv2.VideoCapture(video_source)
+    if not cap.isOpened():
+        print(f"[!] Lỗi: Không thể mở video '{video_source}'")
+        return
+    frame_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    timings['open_video'] = time.perf_counter() - phase_start
     
-    if not parking_slots:
+    # Kiểm tra tọa độ ô đỗ xe (bố cục được biên dịch và cắt theo kích thước khung hình)
+    phase_start = time.perf_counter()
+    layout = SlotLayout.load(slots_data_path, frame_size)
+    timings['load_layout'] = time.perf_counter() - phase_start
+    
+    if layout is None:
         print("[*] Không tìm thấy tọa độ ô đỗ xe. Bắt đầu phát hiện tự động...")
-        parking_slots = slot_detector.detect(video_source)
+        layout = detect_layout(config, video_source, frame_size, timings)
         
-        if parking_slots:
-            slot_detector.save_slots(parking_slots, slots_data_path)
-            print(f"[*] Đã tự động phát hiện và lưu {len(parking_slots)} ô đỗ xe.")
+        if layout is not None:
+            layout.save(slots_data_path)
+            print(f"[*] Đã tự động phát hiện và lưu {len(layout)} ô đỗ xe.")
         else:
             print("[!] Không phát hiện được ô đỗ xe nào từ video.")
+            cap.release()
             return
     else:
-        print(f"[*] Đã tải {len(parking_slots)} ô đỗ xe từ file đã lưu.")
+        print(f"[*] Đã tải {len(layout)} ô đỗ xe từ file đã lưu.")
     
     # Khởi tạo các đối tượng
-    parking_manager = ParkingManager(parking_slots, config)
+    phase_start = time.perf_counter()
+    tracer = Tracer(config) if (config.get('tracing', {}) or {}).get('enabled', False) else None
+    instrumentation = Instrumentation(config, tracer)
+    watchdog = None
+    if (config.get('profiling_watchdog', {}) or {}).get('enabled', False):
+        watchdog = ProfilingWatchdog(config, instrumentation)
+    parking_manager = ParkingManager(layout, config, instrumentation)
     visualizer = Visualizer(config['occupancy_params'])
+    display = DisplayThread(config, instrumentation)
+    # Các nơi nhận kết quả của từng khung hình (cửa sổ hiển thị, ghi hình, ...)
+    sinks = [display]
+    if (config.get('recording', {}) or {}).get('enabled', False):
+        sinks.append(VideoRecorder(config, instrumentation))
+    if (config.get('preview_server', {}) or {}).get('enabled', False):
+        sinks.append(MjpegServer(config, instrumentation))
+    timings['init'] = time.perf_counter() - phase_start
+    timings['total'] = time.perf_counter() - start
+    print("[*] Thời gian khởi động: " + ", ".join(f"{name} {1000 * t:.1f} ms" for name, t in timings.items()))
     
-    # Mở video nguồn
-    cap = cv2.VideoCapture(video_source)
-    if not cap.isOpened():
-        print(f"[!] Lỗi: Không thể mở video '{video_source}'")
-        return
+    # Theo dõi file cấu hình và bố cục để nạp lại mà không cần khởi động lại
+    reload_params = config.get('hot_reload', {}) or {}
+    watcher = None
+    if reload_params.get('enabled', True):
+        watcher = FileWatcher([CONFIG_PATH, slots_data_path], reload_params.get('interval_sec', 1.0))
+    
+    # Gửi SIGUSR1 (kill -USR1 <pid>) để xuất trace của cửa sổ gần nhất mà không dừng chương trình
+    trace_requested = threading.Event()
+    if tracer is not None and hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: trace_requested.set())
     
     print("[*] Bắt đầu chạy hệ thống phát hiện bãi đỗ xe tự động...")
     
-    # Khai báo RESIZE_FACTOR ở đây, giá trị phải GIỐNG HỆT trong slot_annotator.py
-    RESIZE_FACTOR = 0.7 # <--- THÊM DÒNG NÀY
-
-    # Vòng lặp chính
-    while True:
-        ret, frame = cap.read()
+    # Vòng lặp chính (hiển thị chạy trong luồng riêng, không chặn việc phân tích)
+    for sink in sinks:
+        sink.start()
+    while not display.quit_requested:
+        frame_start = time.perf_counter()
+        with instrumentation.span('decode'):
+            ret, frame = cap.read()
         if not ret:
             cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
             continue
         
+        if watcher is not None:
+            changed = watcher.poll()
+            if changed:
+                config = apply_reload(changed, config, parking_manager, sinks, watcher, frame_size)
+        
         # **** THAY ĐỔI QUAN TRỌNG: Luồng dữ liệu được sửa lại ****
 
         # 1. Manager tính toán và trả về tất cả thông tin trạng thái
         available_slots, total_slots, statuses = parking_manager.update_statuses(frame)
         
-        # 2. Visualizer nhận dữ liệu và chỉ vẽ, không tính toán lại
-        final_frame = visualizer.draw_slots(frame, parking_slots, statuses)
-        
-        # 3. Tính toán FPS
+        # 2. Tính toán FPS (tốc độ phân tích, không phụ thuộc tần số làm mới màn hình)
         fps = visualizer.calculate_fps()
         
-        # 4. Vẽ bảng thông tin UI, sử dụng dữ liệu đã được tính toán ở bước 1
-        visualizer.draw_ui_panel(final_frame, available_slots, total_slots, fps)
+        # 3. Gửi kết quả cho luồng hiển thị và các sink khác; mỗi nơi tự vẽ ô và bảng thông tin UI
+        with instrumentation.span('sink'):
+            for sink in sinks:
+                sink.publish(frame, parking_manager.slots, statuses, available_slots, total_slots, fps)
         
-        # Hiển thị khung hình cuối cùng
-        # Thay vì hiển thị final_frame, hãy hiển thị frame đã resize
-        width = int(final_frame.shape[1] * RESIZE_FACTOR) # <--- THÊM DÒNG NÀY
-        height = int(final_frame.shape[0] * RESIZE_FACTOR) # <--- THÊM DÒNG NÀY
-        display_frame = cv2.resize(final_frame, (width, height)) # <--- THÊM DÒNG NÀY
-
-        cv2.imshow("Parking Status", display_frame) # <--- SỬA final_frame thành display_frame
-        
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
+        # Tổng thời gian xử lý một khung hình trên luồng phân tích
+        instrumentation.record_span('frame', frame_start, time.perf_counter())
+        instrumentation.maybe_report()
+        if watchdog is not None:
+            watchdog.on_frame_end(slots=len(parking_manager.slots), frame_size=frame.shape[1::-1])
+        if tracer is not None:
+            tracer.frame_index += 1
+            if trace_requested.is_set():
+                trace_requested.clear()
+                print(f"[*] Đã xuất trace vào '{tracer.export()}'.")
+    for sink in sinks:
+        sink.stop()
+    if instrumentation.enabled:
+        print(instrumentation.report())
+    if tracer is not None:
+        print(f"[*] Đã xuất trace vào '{tracer.export()}'.")
+    
+    # Lưu trạng thái lần cuối để lần chạy sau khôi phục ngay
+    if parking_manager.state_path:
+        parking_manager.save_state(parking_manager.state_path)
     
     # Giải phóng tài nguyên
     cap.release()
@@ -4,6 +4,7 @@ import yaml
 
 # =================== PHẦN CẦN THAY ĐỔI ===================
 # THAY ĐỔI GIÁ TRỊ NÀY ĐỂ CHỈNH KÍCH THƯỚC CỬA SỔ
+# (chỉ ảnh hưởng việc hiển thị; tọa độ luôn được lưu theo khung hình gốc kèm độ phân giải)
 RESIZE_FACTOR = 0.7 
 # ==========================================================
 
@@ -94,8 +95,10 @@ if __name__ == "__main__":
         key = cv2.waitKey(1) & 0xFF
 
         if key == ord('s'):
+            # Lưu kèm độ phân giải gốc để bố cục tự co giãn theo camera/luồng phân tích
+            reference_size = [frame_original.shape[1], frame_original.shape[0]]
             with open(slots_data_path, 'w') as f:
-                json.dump(slots, f)
+                json.dump({'reference_size': reference_size, 'slots': slots}, f)
             print(f"Successfully saved {len(slots)} slots to {slots_data_path}")
             break
         elif key == ord('q'):
@@ -0,0 +1,83 @@
+import hashlib
+import json
+import os
+
+import cv2
+
+
+def video_fingerprint(video_source, num_samples=4, stride=3, thumb_size=32):
+    """
+    Dấu vân tay rẻ của một video: băm kích thước, số khung hình và ảnh thu nhỏ
+    (xám, `thumb_size` x `thumb_size`) của `num_samples` khung hình đầu, cách nhau
+    `stride` khung hình. Đọc tuần tự từ đầu thay vì tua (tua trong mp4 phải giải mã
+    lại từ keyframe nên rất chậm, và không làm được với luồng RTSP).
+
+    Returns:
+        Chuỗi hex, hoặc None nếu không mở được video
+    """
+    cap = cv2.VideoCapture(video_source)
+    if not cap.isOpened():
+        return None
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    digest = hashlib.sha1(f"{width}x{height}:{total}".encode())
+    for _ in range(num_samples):
+        ret, frame = cap.read()
+        if not ret:
+            break
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        thumb = cv2.resize(gray, (thumb_size, thumb_size), interpolation=cv2.INTER_AREA)
+        # Bỏ 3 bit thấp để khác biệt nhỏ giữa các bộ giải mã không đổi dấu vân tay
+        digest.update((thumb >> 3).tobytes())
+        # grab() bỏ qua khung hình mà không chuyển đổi màu / sao chép ảnh
+        for _ in range(stride - 1):
+            if not cap.grab():
+                break
+    cap.release()
+    return digest.hexdigest()
+
+
+def params_digest(detection_params):
+    """Mã băm ổn định của tham số phát hiện (không phụ thuộc thứ tự khóa)."""
+    encoded = json.dumps(detection_params or {}, sort_keys=True, default=str)
+    return hashlib.sha1(encoded.encode()).hexdigest()
+
+
+class DetectionCache:
+    """
+    Bộ đệm kết quả `SlotDetector.detect` trên đĩa, khóa theo dấu vân tay video và mã
+    băm tham số phát hiện. Thư mục có thể đặt trên ổ dùng chung để nhiều node camera
+    cùng nguồn video dùng lại kết quả ngay lập tức.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def _path(self, fingerprint, params_key):
+        return os.path.join(self.cache_dir, f"{fingerprint[:16]}_{params_key[:16]}.json")
+
+    def get(self, fingerprint, params_key):
+        """
+        Returns:
+            Dữ liệu bố cục JSON đã lưu, hoặc None nếu chưa có
+        """
+        path = self._path(fingerprint, params_key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[WARNING] Không thể đọc bộ đệm phát hiện '{path}': {e}")
+            return None
+
+    def put(self, fingerprint, params_key, layout_json):
+        """Lưu dữ liệu bố cục JSON vào bộ đệm (ghi file tạm rồi đổi tên)."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(fingerprint, params_key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(layout_json, f)
+        os.replace(tmp_path, path)
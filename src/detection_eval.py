@@ -0,0 +1,110 @@
+import time
+import numpy as np
+from src.slot_geometry import slot_bounding_box
+
+# Các bước của SlotDetector được đo thời gian khi đánh giá (theo thứ tự trong pipeline)
+DETECTOR_STAGES = (
+    '_preprocess_frame_for_lines', '_detect_lines', '_classify_lines', '_merge_lines',
+    '_merge_lines_fitted', '_merge_lines_local', '_refine_line_position', '_find_slots_from_grid', '_find_slots_from_intersections',
+    '_find_quads_from_intersections', '_suppress_slots',
+)
+
+
+def slot_boxes(slots):
+    """Hộp bao [x1, y1, x2, y2] (float64, (N, 4)) của danh sách ô ở mọi dạng."""
+    return np.array([slot_bounding_box(slot) for slot in slots], dtype=np.float64).reshape(-1, 4)
+
+
+def box_iou_matrix(boxes_a, boxes_b):
+    """Ma trận IoU giữa hai tập hộp [x1, y1, x2, y2]."""
+    a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+    xx1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    yy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    xx2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    yy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def match_boxes(predicted, reference, iou_thresh=0.5):
+    """
+    Ghép hộp dự đoán với hộp tham chiếu: một cặp được ghép khi hai hộp là lựa chọn IoU
+    tốt nhất của nhau và IoU >= `iou_thresh`. Toàn bộ được vector hóa; với ngưỡng >= 0.5
+    kết quả trùng với ghép tham lam theo IoU giảm dần trong các bố cục thông thường.
+
+    Returns:
+        Tuple (chỉ số dự đoán, chỉ số tham chiếu, IoU của từng cặp)
+    """
+    ious = box_iou_matrix(predicted, reference)
+    if ious.size == 0:
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty, np.zeros(0)
+    best_ref = ious.argmax(axis=1)
+    best_pred = ious.argmax(axis=0)
+    pred_idx = np.arange(len(ious))
+    mutual = (best_pred[best_ref] == pred_idx) & (ious[pred_idx, best_ref] >= iou_thresh)
+    pred_idx = pred_idx[mutual]
+    ref_idx = best_ref[mutual]
+    return pred_idx, ref_idx, ious[pred_idx, ref_idx]
+
+
+def match_score(predicted, reference, iou_thresh=0.5):
+    """Trả về (precision, recall) khi ghép ô dự đoán (mọi dạng) với bố cục tham chiếu."""
+    metrics = evaluate_slots(predicted, reference, iou_thresh)
+    return metrics['precision'], metrics['recall']
+
+
+def evaluate_slots(predicted, reference, iou_thresh=0.5):
+    """Precision, recall, F1 và IoU trung bình của các cặp được ghép."""
+    pred_boxes, ref_boxes = slot_boxes(predicted), slot_boxes(reference)
+    _, _, ious = match_boxes(pred_boxes, ref_boxes, iou_thresh)
+    precision = len(ious) / len(pred_boxes) if len(pred_boxes) else 0.0
+    recall = len(ious) / len(ref_boxes) if len(ref_boxes) else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {
+        'predicted': len(pred_boxes),
+        'reference': len(ref_boxes),
+        'matched': len(ious),
+        'precision': precision,
+        'recall': recall,
+        'f1': f1,
+        'mean_iou': float(ious.mean()) if len(ious) else 0.0,
+    }
+
+
+class StageTimer:
+    """
+    Đo thời gian từng bước của một SlotDetector bằng cách bọc các phương thức của chính
+    đối tượng đó (không sửa lớp). Hoạt động với mọi đường chạy (pyramid, grid, quad);
+    với pyramid, các bước tìm đường chạy trên bộ phát hiện thô riêng nên bộ đó cũng
+    được bọc.
+    """
+
+    def __init__(self, detector, stages=DETECTOR_STAGES):
+        self.times = {}
+        targets = [detector]
+        if getattr(detector, 'pyramid_levels', 0) > 0:
+            targets.append(detector._get_coarse_detector())
+        for target in targets:
+            for name in stages:
+                method = getattr(target, name, None)
+                if method is not None:
+                    setattr(target, name, self._wrap(name, method))
+
+    def _wrap(self, name, method):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.times[name] = self.times.get(name, 0.0) + time.perf_counter() - start
+        return timed
+
+    def reset(self):
+        """Trả về thời gian (giây) đã cộng dồn theo từng bước rồi đặt lại về 0."""
+        times, self.times = self.times, {}
+        return times
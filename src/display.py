@@ -0,0 +1,96 @@
+import threading
+import time
+import cv2
+from src.visualizer import Visualizer
+
+class DisplayThread:
+    """
+    Hiển thị kết quả phân tích trong một luồng riêng với tần số làm mới độc lập.
+
+    Vòng lặp phân tích chỉ gọi `publish` để gửi kết quả mới nhất (không chờ, không vẽ);
+    luồng hiển thị thức dậy theo `refresh_fps`, chỉ vẽ khi có kết quả mới và xử lý phím
+    'q'. Khi GUI bị treo (kéo cửa sổ, máy chậm) việc cập nhật trạng thái vẫn chạy đều,
+    các khung hình chưa kịp hiển thị đơn giản bị bỏ qua.
+
+    Với `threaded: false` mọi việc chạy ngay trong `publish` như trước (cần cho các nền
+    tảng chỉ cho phép gọi HighGUI từ luồng chính, ví dụ macOS).
+    """
+
+    def __init__(self, config, instrumentation=None, window_name="Parking Status"):
+        display_params = config.get('display', {}) or {}
+        self.window_name = window_name
+        self.refresh_fps = display_params.get('refresh_fps', 10)
+        self.threaded = display_params.get('threaded', True)
+        self.visualizer = Visualizer(config.get('occupancy_params', {}), instrumentation)
+        self.instrumentation = self.visualizer.instrumentation
+        self.set_params(config)
+
+        # Kết quả mới nhất và số thứ tự của nó; chỉ giữ một bản, bản cũ bị ghi đè
+        self._latest = None
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._quit = threading.Event()
+        self._thread = None
+
+    def set_params(self, config):
+        """Cập nhật tham số hiển thị (có thể gọi khi nạp lại cấu hình)."""
+        self.display_scale = config.get('display_scale', 0.7)
+        self.render_at_display_scale = config.get('render_at_display_scale', True)
+        self.visualizer.alpha = config.get('occupancy_params', {}).get('alpha', 0.5)
+
+    @property
+    def quit_requested(self):
+        """True khi người dùng đã nhấn 'q'."""
+        return self._quit.is_set()
+
+    def start(self):
+        if self.threaded and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="display", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def publish(self, frame, slots, statuses, available_slots, total_slots, fps):
+        """
+        Gửi kết quả của một khung hình. Vòng lặp phân tích không được dùng lại `frame`
+        sau khi gửi (mỗi lần `cap.read()` trả về một mảng mới nên điều này luôn đúng).
+        """
+        result = (frame, slots, statuses, available_slots, total_slots, fps)
+        if not self.threaded:
+            self._show(result)
+            self._poll_keys(1)
+            return
+        with self._lock:
+            self._latest = result
+            self._seq += 1
+
+    def _run(self):
+        period = 1.0 / self.refresh_fps if self.refresh_fps else 0.0
+        shown_seq = 0
+        while not self._stop.is_set():
+            start = time.monotonic()
+            with self._lock:
+                result, seq = self._latest, self._seq
+            if seq != shown_seq:
+                self._show(result)
+                shown_seq = seq
+            # waitKey vừa xử lý sự kiện cửa sổ vừa là khoảng nghỉ giữa hai lần làm mới
+            remaining = period - (time.monotonic() - start)
+            self._poll_keys(max(1, int(1000 * remaining)))
+
+    def _show(self, result):
+        frame, slots, statuses, available_slots, total_slots, fps = result
+        display_frame = self.visualizer.render(frame, slots, statuses, available_slots, total_slots, fps,
+                                               self.display_scale, self.render_at_display_scale)
+        with self.instrumentation.span('display'):
+            cv2.imshow(self.window_name, display_frame)
+
+    def _poll_keys(self, delay_ms):
+        if cv2.waitKey(delay_ms) & 0xFF == ord('q'):
+            self._quit.set()
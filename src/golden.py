@@ -0,0 +1,128 @@
+import copy
+import os
+import time
+import cv2
+import numpy as np
+from src.detection_cache import params_digest, video_fingerprint
+from src.parking_manager import ParkingManager
+
+GOLDEN_VERSION = 1
+
+
+def golden_config(config):
+    """Cấu hình dùng khi ghi/kiểm tra: luôn bắt đầu từ trạng thái trống, không ghi ra đĩa."""
+    config = copy.deepcopy(config)
+    config['state_persistence'] = {'enabled': False}
+    return config
+
+
+def analysis_digest(config):
+    """Mã băm các tham số ảnh hưởng tới kết quả phân tích trạng thái."""
+    return params_digest({'occupancy_params': config.get('occupancy_params', {}),
+                          'analysis_scale': config.get('analysis_scale', 1.0)})
+
+
+def run_frames(video_source, config, layout, max_frames=None):
+    """
+    Chạy ParkingManager trên từng khung hình của video (từ đầu, không lặp lại).
+
+    Yields:
+        Tuple (trạng thái trống của từng ô, tỷ lệ điểm ảnh khác 0 của từng ô)
+    """
+    cap = cv2.VideoCapture(video_source)
+    if not cap.isOpened():
+        raise IOError(f"Không thể mở video '{video_source}'")
+    manager = ParkingManager(layout, golden_config(config))
+    count = 0
+    try:
+        while max_frames is None or count < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            statuses = manager.update_statuses(frame)[2]
+            yield np.asarray(statuses, dtype=bool), manager.last_ratios
+            count += 1
+    finally:
+        cap.release()
+
+
+def record_golden(path, video_source, config, layout, max_frames=None):
+    """
+    Ghi kết quả phân tích của từng khung hình ra file golden gọn nhẹ: trạng thái dạng bit
+    nén (np.packbits) và tỷ lệ dạng float16, kèm mã băm bố cục, tham số và video.
+
+    Returns:
+        Số khung hình đã ghi
+    """
+    statuses, ratios = [], []
+    for frame_statuses, frame_ratios in run_frames(video_source, config, layout, max_frames):
+        statuses.append(np.packbits(frame_statuses))
+        ratios.append(frame_ratios.astype(np.float16))
+    if not statuses:
+        raise ValueError(f"Không đọc được khung hình nào từ video '{video_source}'")
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez_compressed(
+            f, version=np.int32(GOLDEN_VERSION), num_slots=np.int32(len(layout)),
+            statuses=np.stack(statuses), ratios=np.stack(ratios),
+            layout_digest=np.array(layout.digest), params_digest=np.array(analysis_digest(config)),
+            video_fingerprint=np.array(video_fingerprint(video_source) or ''),
+            recorded_at=np.array(time.strftime('%Y-%m-%dT%H:%M:%S')))
+    os.replace(tmp_path, path)
+    return len(statuses)
+
+
+def check_golden(path, video_source, config, layout, ratio_tol=0.0):
+    """
+    Chạy lại ParkingManager hiện tại và so sánh từng khung hình với file golden.
+
+    Tỷ lệ được làm tròn về float16 như lúc ghi trước khi so sánh, nên `ratio_tol=0`
+    nghĩa là khớp tuyệt đối ở độ chính xác của file.
+
+    Returns:
+        Dict gồm 'frames' (số khung hình đã so), 'warnings' (khác biệt về mã băm) và
+        'divergence' (None nếu khớp, hoặc dict frame/slot/kind/expected/actual của chỗ
+        khác biệt đầu tiên)
+    """
+    with np.load(path) as data:
+        if int(data['version']) != GOLDEN_VERSION:
+            raise ValueError(f"Phiên bản file golden không được hỗ trợ: {int(data['version'])}")
+        num_slots = int(data['num_slots'])
+        expected_statuses = np.unpackbits(data['statuses'], axis=1, count=num_slots).astype(bool)
+        expected_ratios = data['ratios']
+        digests = {key: str(data[key]) for key in ('layout_digest', 'params_digest', 'video_fingerprint')}
+
+    if len(layout) != num_slots:
+        raise ValueError(f"Bố cục có {len(layout)} ô, file golden có {num_slots} ô")
+    warnings = []
+    if digests['layout_digest'] != layout.digest:
+        warnings.append("Bố cục ô khác với lúc ghi")
+    if digests['params_digest'] != analysis_digest(config):
+        warnings.append("Tham số phân tích khác với lúc ghi")
+    fingerprint = video_fingerprint(video_source)
+    if digests['video_fingerprint'] and fingerprint and digests['video_fingerprint'] != fingerprint:
+        warnings.append("Video khác với lúc ghi")
+
+    frames = 0
+    for i, (statuses, ratios) in enumerate(run_frames(video_source, config, layout, len(expected_statuses))):
+        frames += 1
+        actual = ratios.astype(np.float16)
+        expected = expected_ratios[i]
+        # NaN (ô bị bỏ qua) chỉ khớp với NaN
+        ratio_diff = np.abs(actual.astype(np.float32) - expected.astype(np.float32)) > ratio_tol
+        ratio_diff |= np.isnan(actual) != np.isnan(expected)
+        status_diff = statuses != expected_statuses[i]
+        for kind, diff, want, got in (('ratio', ratio_diff, expected, actual),
+                                      ('status', status_diff, expected_statuses[i], statuses)):
+            if diff.any():
+                slot = int(np.flatnonzero(diff)[0])
+                return {'frames': frames, 'warnings': warnings, 'divergence': {
+                    'frame': i, 'slot': slot, 'kind': kind,
+                    'expected': want[slot].item(), 'actual': got[slot].item(),
+                    'slots_differing': int(diff.sum())}}
+
+    if frames < len(expected_statuses):
+        warnings.append(f"Video chỉ có {frames} khung hình, file golden có {len(expected_statuses)}")
+    return {'frames': frames, 'warnings': warnings, 'divergence': None}
@@ -0,0 +1,53 @@
+import os
+import time
+
+
+class FileWatcher:
+    """
+    Theo dõi thay đổi của các file bằng cách thăm dò thời gian sửa đổi (mtime).
+    Chi phí mỗi khung hình chỉ là một phép so sánh thời gian; `os.stat` được gọi
+    tối đa một lần mỗi `interval` giây.
+    """
+
+    def __init__(self, paths, interval=1.0):
+        """
+        Args:
+            paths: Danh sách đường dẫn cần theo dõi
+            interval: Khoảng thời gian tối thiểu giữa hai lần kiểm tra (giây)
+        """
+        self.interval = interval
+        self._mtimes = {path: self._mtime(path) for path in paths}
+        self._next_check = time.monotonic() + interval
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def watch(self, path):
+        """Thêm (hoặc đặt lại) một file cần theo dõi."""
+        self._mtimes[path] = self._mtime(path)
+
+    def poll(self):
+        """
+        Returns:
+            Tập các đường dẫn đã thay đổi kể từ lần kiểm tra trước (rỗng nếu chưa
+            đến lượt kiểm tra)
+        """
+        now = time.monotonic()
+        if now < self._next_check:
+            return set()
+        self._next_check = now + self.interval
+
+        changed = set()
+        for path, previous in self._mtimes.items():
+            current = self._mtime(path)
+            if current != previous:
+                self._mtimes[path] = current
+                # File đang được ghi dở hoặc bị xóa tạm thời: đợi lần kiểm tra sau
+                if current is not None:
+                    changed.add(path)
+        return changed
@@ -0,0 +1,125 @@
+import threading
+import time
+import numpy as np
+
+# Thứ tự các giai đoạn khi in báo cáo; giai đoạn khác (nếu có) được in sau
+STAGES = ('decode', 'preprocess', 'classify', 'sink', 'frame', 'render', 'draw_slots', 'draw_ui_panel',
+          'display', 'encode')
+
+class _NullSpan:
+    """Span rỗng dùng khi tắt đo đạc: không đọc đồng hồ, không cấp phát."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_SPAN = _NullSpan()
+
+class _Span:
+    __slots__ = ('_owner', '_stage', '_start')
+
+    def __init__(self, owner, stage):
+        self._owner = owner
+        self._stage = stage
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._owner.record_span(self._stage, self._start, time.perf_counter())
+        return False
+
+class Instrumentation:
+    """
+    Đo thời gian từng giai đoạn của pipeline bằng đồng hồ đơn điệu và giữ các mẫu gần
+    nhất trong bộ đệm vòng kích thước cố định để tính p50/p95/p99 cuộn.
+
+    Dùng `with instrumentation.span('preprocess'): ...` quanh đoạn mã cần đo. Khi tắt,
+    `span` trả về một span rỗng dùng chung nên chi phí gần như bằng 0. Nếu có `tracer`
+    (src.tracing.Tracer) thì mỗi span còn được ghi lại để xuất Chrome trace, kể cả khi
+    phần thống kê bị tắt.
+    """
+
+    def __init__(self, config, tracer=None):
+        params = config.get('instrumentation', {}) or {}
+        self.enabled = params.get('enabled', False)
+        self.tracer = tracer
+        self.window = params.get('window', 512)
+        self.report_interval = params.get('report_interval_sec', 10)
+        self._next_report = time.monotonic() + self.report_interval
+        # stage -> [bộ đệm vòng (giây), số mẫu đã ghi]
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def span(self, stage):
+        """Context manager đo thời gian của một giai đoạn."""
+        if not self.enabled and self.tracer is None:
+            return NULL_SPAN
+        return _Span(self, stage)
+
+    def record_span(self, stage, start, end):
+        """Ghi một span có thời điểm bắt đầu/kết thúc (time.perf_counter())."""
+        self.record(stage, end - start)
+        if self.tracer is not None:
+            self.tracer.add(stage, start, end)
+
+    def record(self, stage, seconds):
+        """Ghi một mẫu thời gian (giây) cho giai đoạn `stage`."""
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self._buffers.get(stage)
+            if entry is None:
+                entry = self._buffers[stage] = [np.zeros(self.window), 0]
+            entry[0][entry[1] % self.window] = seconds
+            entry[1] += 1
+
+    def samples(self, stage):
+        """Các mẫu (giây) đang có trong bộ đệm của một giai đoạn."""
+        with self._lock:
+            entry = self._buffers.get(stage)
+            if entry is None:
+                return np.zeros(0)
+            return entry[0][:min(entry[1], self.window)].copy()
+
+    def percentiles(self, stage, q=(50, 95, 99)):
+        """Các phân vị (ms) của giai đoạn trên cửa sổ mẫu gần nhất, None nếu chưa có mẫu."""
+        values = self.samples(stage)
+        if len(values) == 0:
+            return None
+        return tuple(float(v) for v in np.percentile(values, q) * 1000)
+
+    def rolling_fps(self, stage='frame'):
+        """FPS trung bình trên cửa sổ mẫu gần nhất của giai đoạn `stage`."""
+        values = self.samples(stage)
+        if len(values) == 0 or values.mean() <= 0:
+            return 0.0
+        return float(1.0 / values.mean())
+
+    def summary(self):
+        """Thống kê mọi giai đoạn: {stage: {'count', 'p50', 'p95', 'p99'}} (ms)."""
+        with self._lock:
+            stages = {stage: entry[1] for stage, entry in self._buffers.items()}
+        result = {}
+        for stage in sorted(stages, key=lambda s: (STAGES.index(s) if s in STAGES else len(STAGES), s)):
+            p50, p95, p99 = self.percentiles(stage)
+            result[stage] = {'count': stages[stage], 'p50': p50, 'p95': p95, 'p99': p99}
+        return result
+
+    def report(self):
+        """Một dòng tóm tắt cho đầu ra dạng văn bản (chạy không màn hình)."""
+        parts = [f"{stage} {s['p50']:.1f}/{s['p95']:.1f}/{s['p99']:.1f}" for stage, s in self.summary().items()]
+        return f"[*] Thời gian (ms, p50/p95/p99): {' | '.join(parts)} | FPS {self.rolling_fps():.1f}"
+
+    def maybe_report(self):
+        """In báo cáo nếu đã đến chu kỳ `report_interval_sec`."""
+        if not self.enabled or not self.report_interval or time.monotonic() < self._next_report:
+            return
+        self._next_report = time.monotonic() + self.report_interval
+        print(self.report())
+
+NULL_INSTRUMENTATION = Instrumentation({})
@@ -0,0 +1,201 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cv2
+from src.visualizer import Visualizer
+
+BOUNDARY = "frame"
+
+INDEX_HTML = b"""<!DOCTYPE html>
+<html><head><title>Parking Status</title></head>
+<body style="margin:0;background:#000"><img src="/stream" style="max-width:100%"></body></html>
+"""
+
+class MjpegServer:
+    """
+    Máy chủ HTTP nhỏ (thư viện chuẩn) phát khung hình đã vẽ chú thích dưới dạng MJPEG để
+    theo dõi từ xa các máy không có màn hình.
+
+    Chỉ vẽ và nén JPEG khi có ít nhất một người xem; khi không ai kết nối, `publish` trả
+    về ngay. Mỗi khung hình được nén một lần trong luồng mã hóa rồi gửi cùng bản cho mọi
+    người xem.
+
+    Đường dẫn: `/` (trang xem), `/stream` (MJPEG), `/snapshot.jpg` (một khung hình).
+    """
+
+    def __init__(self, config, instrumentation=None):
+        params = config.get('preview_server', {}) or {}
+        self.host = params.get('host', "127.0.0.1")
+        self.port = params.get('port', 8080)
+        self.stream_fps = params.get('fps', 10)
+        self.scale = params.get('scale', 0.5)
+        self.jpeg_quality = params.get('jpeg_quality', 80)
+        self.visualizer = Visualizer(config.get('occupancy_params', {}), instrumentation)
+        self.instrumentation = self.visualizer.instrumentation
+        self.set_params(config)
+
+        self._clients = 0
+        self._stopped = False
+        # Kết quả phân tích mới nhất chờ được nén
+        self._latest = None
+        self._result_ready = threading.Condition()
+        # JPEG mới nhất và số thứ tự của nó, dùng chung cho mọi người xem
+        self._jpeg = None
+        self._jpeg_seq = 0
+        self._jpeg_ready = threading.Condition()
+
+        self._server = None
+        self._threads = []
+
+    def set_params(self, config):
+        """Cập nhật tham số vẽ (có thể gọi khi nạp lại cấu hình)."""
+        self.visualizer.alpha = config.get('occupancy_params', {}).get('alpha', 0.5)
+
+    @property
+    def address(self):
+        """(host, port) thực sự đang lắng nghe (port 0 trong cấu hình = cổng bất kỳ)."""
+        return self._server.server_address if self._server is not None else (self.host, self.port)
+
+    @property
+    def clients(self):
+        return self._clients
+
+    def start(self):
+        if self._server is not None:
+            return self
+        self._server = ThreadingHTTPServer((self.host, self.port), _make_handler(self))
+        self._server.daemon_threads = True
+        self._threads = [threading.Thread(target=self._server.serve_forever, name="mjpeg-http", daemon=True),
+                         threading.Thread(target=self._encode_loop, name="mjpeg-encoder", daemon=True)]
+        for thread in self._threads:
+            thread.start()
+        host, port = self.address[:2]
+        print(f"[*] Máy chủ xem trước MJPEG: http://{host}:{port}/")
+        return self
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._stopped = True
+        for condition in (self._result_ready, self._jpeg_ready):
+            with condition:
+                condition.notify_all()
+        self._server.shutdown()
+        self._server.server_close()
+        for thread in self._threads:
+            thread.join()
+        self._server = None
+
+    def publish(self, frame, slots, statuses, available_slots, total_slots, fps):
+        """Nhận kết quả của một khung hình; bỏ qua ngay nếu không có ai đang xem."""
+        if not self._clients:
+            return
+        with self._result_ready:
+            self._latest = (frame, slots, statuses, available_slots, total_slots, fps)
+            self._result_ready.notify()
+
+    def _encode_loop(self):
+        period = 1.0 / self.stream_fps if self.stream_fps else 0.0
+        params = [cv2.IMWRITE_JPEG_QUALITY, int(self.jpeg_quality)]
+        while not self._stopped:
+            with self._result_ready:
+                while self._latest is None and not self._stopped:
+                    self._result_ready.wait()
+                result, self._latest = self._latest, None
+            if result is None:
+                break
+            start = time.monotonic()
+            frame, slots, statuses, available_slots, total_slots, fps = result
+            rendered = self.visualizer.render(frame, slots, statuses, available_slots, total_slots, fps,
+                                              self.scale)
+            with self.instrumentation.span('encode'):
+                ok, encoded = cv2.imencode('.jpg', rendered, params)
+            if ok:
+                with self._jpeg_ready:
+                    self._jpeg = encoded.tobytes()
+                    self._jpeg_seq += 1
+                    self._jpeg_ready.notify_all()
+            # Giới hạn tốc độ phát; kết quả đến trong lúc chờ được gộp thành bản mới nhất
+            time.sleep(max(0.0, period - (time.monotonic() - start)))
+
+    def _next_jpeg(self, last_seq, timeout):
+        """Chờ JPEG mới hơn `last_seq`; trả về (seq, bytes) hoặc None nếu hết giờ/đã dừng."""
+        with self._jpeg_ready:
+            ready = self._jpeg_ready.wait_for(lambda: self._stopped or self._jpeg_seq != last_seq, timeout)
+            if not ready or self._stopped:
+                return None
+            return self._jpeg_seq, self._jpeg
+
+    def _current_seq(self):
+        """Số thứ tự của JPEG đang lưu; người xem mới chờ bản mới hơn số này."""
+        with self._jpeg_ready:
+            return self._jpeg_seq
+
+    def _add_client(self, delta):
+        with self._result_ready:
+            self._clients += delta
+
+
+def _make_handler(preview):
+    """Tạo lớp xử lý yêu cầu gắn với một MjpegServer."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path in ('/', '/index.html'):
+                self._send(200, 'text/html; charset=utf-8', INDEX_HTML)
+            elif self.path == '/stream':
+                self._stream()
+            elif self.path == '/snapshot.jpg':
+                self._snapshot()
+            else:
+                self.send_error(404)
+
+        def _send(self, code, content_type, body):
+            self.send_response(code)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _snapshot(self):
+            preview._add_client(1)
+            try:
+                frame = preview._next_jpeg(preview._current_seq(), timeout=5.0)
+            finally:
+                preview._add_client(-1)
+            if frame is None:
+                self.send_error(503, "No frame available yet")
+                return
+            self._send(200, 'image/jpeg', frame[1])
+
+        def _stream(self):
+            self.send_response(200)
+            self.send_header('Content-Type', f'multipart/x-mixed-replace; boundary={BOUNDARY}')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            preview._add_client(1)
+            try:
+                # Bản JPEG đang lưu có thể đã cũ (được nén khi người xem trước còn kết nối):
+                # chỉ gửi từ khung hình được nén sau khi người xem này kết nối
+                seq = preview._current_seq()
+                while True:
+                    frame = preview._next_jpeg(seq, timeout=1.0)
+                    if frame is None:
+                        if preview._stopped:
+                            break
+                        continue
+                    seq, jpeg = frame
+                    self.wfile.write(f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                                     f"Content-Length: {len(jpeg)}\r\n\r\n".encode('ascii'))
+                    self.wfile.write(jpeg)
+                    self.wfile.write(b"\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                preview._add_client(-1)
+
+        def log_message(self, format, *args):
+            # Không in log cho từng yêu cầu
+            pass
+
+    return Handler
@@ -1,77 +1,209 @@
+import os
+import time
 import cv2
 import numpy as np
+from src.slot_layout import SlotLayout
+from src.instrumentation import NULL_INSTRUMENTATION
 
 class ParkingManager:
     """
     Lớp quản lý trạng thái các ô đỗ xe.
     """
-    
-    def __init__(self, slots, config):
+
+    def __init__(self, slots, config, instrumentation=None):
         """
         Khởi tạo ParkingManager.
-        
+
         Args:
-            slots: Danh sách các ô đỗ xe dưới dạng [x1, y1, x2, y2]
+            slots: SlotLayout đã biên dịch, hoặc danh sách các ô dưới dạng hộp
+                [x1, y1, x2, y2], đa giác [[x, y], ...] hoặc hình chữ nhật xoay
+                {'center', 'size', 'angle'} (sẽ được biên dịch thành SlotLayout)
             config: Cấu hình chứa các tham số quản lý
+            instrumentation: Đối tượng Instrumentation để đo thời gian các giai đoạn (tùy chọn)
+        """
+        self.instrumentation = instrumentation or NULL_INSTRUMENTATION
+        self.layout = slots if isinstance(slots, SlotLayout) else SlotLayout(slots)
+        self.slots = self.layout.slots
+        self.set_params(config.get('occupancy_params', {}))
+
+        # Hệ số thu nhỏ khung hình trước khi phân tích (ví dụ 0.5 cho luồng phụ bitrate thấp);
+        # bố cục được co giãn tự động theo kích thước khung hình thực sự được phân tích
+        self.analysis_scale = config.get('analysis_scale', 1.0)
+        self._analysis_layouts = {}
+
+        # Khởi tạo trạng thái cho các ô đỗ xe (mảng để cập nhật vector hóa)
+        self.is_free = np.ones(len(self.slots), dtype=bool)
+        self.stable_count = np.zeros(len(self.slots), dtype=np.int32)
+        # Tỷ lệ điểm ảnh khác 0 của từng ô ở khung hình gần nhất (NaN với ô bị bỏ qua)
+        self.last_ratios = np.full(len(self.slots), np.nan)
+
+        # Lưu trạng thái định kỳ để khởi động lại có ngay số liệu đúng từ khung hình đầu
+        persistence = config.get('state_persistence', {}) or {}
+        self.state_path = persistence.get('path') if persistence.get('enabled', False) else None
+        self.snapshot_interval = persistence.get('interval_sec', 5.0)
+        self._next_snapshot = time.monotonic() + self.snapshot_interval
+        if self.state_path and self.load_state(self.state_path):
+            print(f"[*] Đã khôi phục trạng thái {len(self.slots)} ô đỗ xe từ '{self.state_path}'.")
+
+    def set_params(self, occupancy_params):
+        """Cập nhật các ngưỡng xác định trạng thái (có thể gọi giữa hai khung hình)."""
+        self.occupancy_params = occupancy_params
+        self.empty_threshold = occupancy_params.get('empty_threshold', 0.25)
+        self.stability_threshold = occupancy_params.get('stability_threshold', 5)
+        self.alpha = occupancy_params.get('alpha', 0.5)
+
+    def set_layout(self, layout):
         """
-        self.slots = slots
-        self.occupancy_params = config.get('occupancy_params', {})
-        self.empty_threshold = self.occupancy_params.get('empty_threshold', 0.25)
-        self.stability_threshold = self.occupancy_params.get('stability_threshold', 5)
-        self.alpha = self.occupancy_params.get('alpha', 0.5)
-        
-        # Khởi tạo trạng thái cho các ô đỗ xe
-        self.slot_statuses = [{'is_free': True, 'stable_count': 0} for _ in self.slots]
-        
+        Thay bố cục ô giữa hai khung hình. Trạng thái ổn định của những ô có hình học
+        không đổi được giữ nguyên; ô mới bắt đầu ở trạng thái trống.
+
+        Returns:
+            Số ô giữ lại được trạng thái
+        """
+        if not isinstance(layout, SlotLayout):
+            layout = SlotLayout(layout)
+        previous = {key: i for i, key in enumerate(self.layout.geometry_keys())}
+        is_free = np.ones(len(layout), dtype=bool)
+        stable_count = np.zeros(len(layout), dtype=np.int32)
+        carried = 0
+        for i, key in enumerate(layout.geometry_keys()):
+            j = previous.get(key)
+            if j is not None:
+                is_free[i] = self.is_free[j]
+                stable_count[i] = self.stable_count[j]
+                carried += 1
+
+        # Gán tất cả cùng lúc sau khi đã tính xong trạng thái mới
+        self.layout, self.slots, self.is_free, self.stable_count = layout, layout.slots, is_free, stable_count
+        self.last_ratios = np.full(len(layout), np.nan)
+        return carried
+
     def update_statuses(self, frame):
         """
         Cập nhật trạng thái các ô đỗ xe dựa trên khung hình hiện tại.
-        
+
         Args:
             frame: Khung hình hiện tại từ video
-            
+
         Returns:
             Tuple gồm (số ô trống, tổng số ô, trạng thái từng ô)
         """
-        processed_frame = self._preprocess_frame(frame)
-        occupied_slots = 0
-        
-        for i, (xi, yi, xf, yf) in enumerate(self.slots):
-            # Cắt phần ảnh tương ứng với ô đỗ xe
-            spot_crop = processed_frame[yi:yf, xi:xf]
-            
-            h, w = spot_crop.shape[:2]
-            if h == 0 or w == 0:
-                continue
-            
-            # Tính toán tỷ lệ điểm ảnh không bằng 0 (ô có thể bị chiếm)
-            ratio = cv2.countNonZero(spot_crop) / (w * h)
-            current_is_free = ratio < self.empty_threshold
-            
-            # Cập nhật trạng thái với cơ chế ổn định
-            status_info = self.slot_statuses[i]
-            if current_is_free != status_info['is_free']:
-                status_info['stable_count'] += 1
-                if status_info['stable_count'] >= self.stability_threshold:
-                    status_info['is_free'] = current_is_free
-                    status_info['stable_count'] = 0
-            else:
-                status_info['stable_count'] = 0
-            
-            # Cập nhật số ô đang được sử dụng
-            if not status_info['is_free']:
-                occupied_slots += 1
-        
+        with self.instrumentation.span('preprocess'):
+            if self.analysis_scale != 1.0:
+                frame = cv2.resize(frame, None, fx=self.analysis_scale, fy=self.analysis_scale,
+                                   interpolation=cv2.INTER_AREA)
+            processed_frame = self._preprocess_frame(frame)
+
+        with self.instrumentation.span('classify'):
+            self._classify(processed_frame)
+
+        # Ô có diện tích bằng 0 bị bỏ qua và luôn được tính là trống
+        occupied_slots = int(np.count_nonzero(~self.is_free))
         available_slots = len(self.slots) - occupied_slots
-        return available_slots, len(self.slots), [status['is_free'] for status in self.slot_statuses]
-    
+
+        if self.state_path and time.monotonic() >= self._next_snapshot:
+            self._next_snapshot = time.monotonic() + self.snapshot_interval
+            try:
+                self.save_state(self.state_path)
+            except OSError as e:
+                print(f"[WARNING] Không thể lưu trạng thái ô đỗ xe: {e}")
+
+        return available_slots, len(self.slots), self.is_free.tolist()
+
+    def _classify(self, processed_frame):
+        """Đếm điểm ảnh khác 0 trong từng ô và cập nhật trạng thái với cơ chế ổn định."""
+        # Mặt nạ các ô được raster hóa một lần cho mỗi kích thước khung hình (lưu đệm trong layout)
+        layout = self._analysis_layout(processed_frame.shape)
+        valid, corner_index, rect_offsets, areas = layout.integral_indices(processed_frame.shape)
+        if not len(valid):
+            return
+
+        # Tỷ lệ điểm ảnh khác 0 của từng ô (ô có thể bị chiếm)
+        ratio = self._count_nonzero(processed_frame, corner_index, rect_offsets) / areas
+        last_ratios = np.full(len(self.slots), np.nan)
+        last_ratios[valid] = ratio
+        self.last_ratios = last_ratios
+        current_is_free = ratio < self.empty_threshold
+
+        # Cập nhật trạng thái với cơ chế ổn định
+        changed = current_is_free != self.is_free[valid]
+        stable_count = np.where(changed, self.stable_count[valid] + 1, 0)
+        flip = changed & (stable_count >= self.stability_threshold)
+        stable_count[flip] = 0
+        self.stable_count[valid] = stable_count
+        self.is_free[valid[flip]] = current_is_free[flip]
+
+    def _analysis_layout(self, frame_shape):
+        """Bố cục co giãn về kích thước khung hình được phân tích (lưu đệm theo kích thước)."""
+        frame_size = (frame_shape[1], frame_shape[0])
+        if self.layout.frame_size is None or self.layout.frame_size == frame_size:
+            return self.layout
+        cached = self._analysis_layouts.get(frame_size)
+        if cached is None or cached[0] is not self.layout:
+            scaled = self.layout.scaled_to(frame_size)
+            # Chỉ số ô của bố cục co giãn phải trùng với is_free / stable_count
+            if len(scaled) != len(self.layout):
+                raise ValueError(f"Bố cục co giãn có {len(scaled)} ô, bố cục gốc có {len(self.layout)} ô")
+            cached = (self.layout, scaled)
+            self._analysis_layouts[frame_size] = cached
+        return cached[1]
+
+    def save_state(self, path):
+        """
+        Lưu mảng trạng thái kèm mã băm của bố cục ra file nhị phân nhỏ. Ghi vào file
+        tạm rồi đổi tên nên file trên đĩa luôn nguyên vẹn kể cả khi tiến trình bị dừng.
+        """
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, layout_digest=np.array(self.layout.digest),
+                     is_free=np.packbits(self.is_free), stable_count=self.stable_count,
+                     saved_at=np.float64(time.time()))
+        os.replace(tmp_path, path)
+
+    def load_state(self, path):
+        """
+        Khôi phục trạng thái đã lưu nếu file tồn tại và được tạo với cùng bố cục ô.
+
+        Returns:
+            True nếu đã khôi phục
+        """
+        if not os.path.exists(path):
+            return False
+        try:
+            with np.load(path) as data:
+                if str(data['layout_digest']) != self.layout.digest:
+                    print("[*] Bố cục ô đã thay đổi, bỏ qua trạng thái đã lưu.")
+                    return False
+                is_free = np.unpackbits(data['is_free'], count=len(self.slots)).astype(bool)
+                stable_count = data['stable_count'].astype(np.int32)
+        except (OSError, KeyError, ValueError) as e:
+            print(f"[WARNING] Không thể đọc trạng thái đã lưu '{path}': {e}")
+            return False
+        if len(stable_count) != len(self.slots):
+            return False
+        self.is_free, self.stable_count = is_free, stable_count
+        return True
+
+    def _count_nonzero(self, processed_frame, corner_index, rect_offsets):
+        """
+        Số điểm ảnh khác 0 trong từng ô hợp lệ. Mỗi ô là một dãy hình chữ nhật trên ảnh
+        tích phân, nên phép đếm tương đương nhân ma trận mặt nạ thưa với ảnh nhị phân
+        và được thực hiện hoàn toàn vector hóa thay vì `fillPoly` / `bitwise_and` từng ô.
+        """
+        binary = cv2.threshold(processed_frame, 0, 1, cv2.THRESH_BINARY)[1]
+        integral = cv2.integral(binary, sdepth=cv2.CV_32S).ravel()
+        corners = integral[corner_index]
+        rect_counts = corners[0] - corners[1] - corners[2] + corners[3]
+        return np.add.reduceat(rect_counts, rect_offsets)
+
     def _preprocess_frame(self, frame):
         """
         Tiền xử lý khung hình để dễ dàng phát hiện trạng thái ô đỗ xe.
-        
+
         Args:
             frame: Khung hình đầu vào
-            
+
         Returns:
             Ảnh đã xử lý
         """
@@ -80,4 +212,4 @@ class ParkingManager:
         th_frame = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 15, 5)
         kernel = np.ones((3, 3), np.uint8)
         processed_frame = cv2.morphologyEx(th_frame, cv2.MORPH_OPEN, kernel, iterations=1)
-        return processed_frame
\ No newline at end of file
+        return processed_frame
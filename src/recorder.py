@@ -0,0 +1,155 @@
+import os
+import queue
+import threading
+import time
+import cv2
+import numpy as np
+from src.visualizer import Visualizer
+
+class VideoRecorder:
+    """
+    Ghi video đã vẽ chú thích ra file bằng `cv2.VideoWriter` trong một luồng nền.
+
+    Vòng lặp phân tích chỉ đưa kết quả vào hàng đợi có giới hạn; việc vẽ và mã hóa chạy
+    ở luồng nền nên không làm chậm việc phân tích. Khi hàng đợi đầy, chính sách 'drop'
+    bỏ khung hình mới (mặc định), 'block' chờ cho đến khi có chỗ (không mất khung hình
+    nhưng có thể làm chậm vòng lặp phân tích).
+
+    Khung hình được lấy thưa theo `fps` (theo đồng hồ thực) và file được chia đoạn sau
+    mỗi `segment_sec` giây video.
+    """
+
+    def __init__(self, config, instrumentation=None):
+        params = config.get('recording', {}) or {}
+        self.path_pattern = params.get('path', "data/recordings/parking_%Y%m%d_%H%M%S.mp4")
+        self.fourcc = params.get('fourcc', 'mp4v')
+        self.record_fps = params.get('fps', 10)
+        self.segment_sec = params.get('segment_sec', 600)
+        self.scale = params.get('scale', 1.0)
+        self.policy = params.get('queue_policy', 'drop')
+        if self.policy not in ('drop', 'block'):
+            raise ValueError(f"recording.queue_policy không hợp lệ: '{self.policy}' (chỉ hỗ trợ 'drop', 'block')")
+        self.report_interval = params.get('report_interval_sec', 30)
+        self.visualizer = Visualizer(config.get('occupancy_params', {}), instrumentation)
+        self.instrumentation = self.visualizer.instrumentation
+        self.set_params(config)
+
+        self._queue = queue.Queue(maxsize=params.get('queue_size', 32))
+        self._thread = None
+        self._next_due = 0.0
+
+        # Thống kê (chỉ luồng nền ghi các giá trị mã hóa, chỉ luồng phân tích ghi `dropped`)
+        self.dropped = 0
+        self.written = 0
+        self.segments = 0
+        self._encode_times = []
+
+        self._writer = None
+        self._segment_frames = 0
+        self._failed = False
+
+    def set_params(self, config):
+        """Cập nhật tham số vẽ (có thể gọi khi nạp lại cấu hình)."""
+        self.visualizer.alpha = config.get('occupancy_params', {}).get('alpha', 0.5)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="recorder", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Ghi nốt các khung hình còn trong hàng đợi, đóng file và in thống kê."""
+        if self._thread is not None:
+            # Luồng nền đã dừng vì lỗi thì không còn ai lấy khỏi hàng đợi
+            if self._thread.is_alive():
+                self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        self._report()
+
+    def publish(self, frame, slots, statuses, available_slots, total_slots, fps):
+        """Đưa kết quả của một khung hình vào hàng đợi ghi (đã lấy thưa theo `fps`)."""
+        now = time.monotonic()
+        if self._failed or now < self._next_due:
+            return
+        # Bám theo lịch cố định, nhưng không dồn khung hình nếu bị trễ quá một chu kỳ
+        self._next_due = max(self._next_due + 1.0 / self.record_fps, now)
+        item = (frame, slots, statuses, available_slots, total_slots, fps)
+        if self.policy == 'block':
+            self._queue.put(item)
+            return
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def stats(self):
+        """Thống kê ghi hình: số khung hình đã ghi/bị bỏ, thời gian mã hóa (ms)."""
+        encode_ms = 1000 * np.asarray(self._encode_times[-1000:] or [0.0])
+        return {
+            'written': self.written,
+            'dropped': self.dropped,
+            'segments': self.segments,
+            'queued': self._queue.qsize(),
+            'encode_ms_mean': float(encode_ms.mean()),
+            'encode_ms_p95': float(np.percentile(encode_ms, 95)),
+        }
+
+    def _run(self):
+        next_report = time.monotonic() + self.report_interval
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            start = time.perf_counter()
+            frame, slots, statuses, available_slots, total_slots, fps = item
+            rendered = self.visualizer.render(frame, slots, statuses, available_slots, total_slots, fps,
+                                              self.scale)
+            try:
+                self._write(rendered)
+            except (IOError, cv2.error) as e:
+                print(f"[WARNING] Dừng ghi hình: {e}")
+                self._failed = True
+                break
+            self._encode_times.append(time.perf_counter() - start)
+            if len(self._encode_times) > 2000:
+                del self._encode_times[:1000]
+            if self.report_interval and time.monotonic() >= next_report:
+                next_report = time.monotonic() + self.report_interval
+                self._report()
+        self._close_segment()
+
+    def _write(self, frame):
+        if self._writer is None or self._segment_frames >= self.segment_sec * self.record_fps:
+            self._open_segment(frame)
+        with self.instrumentation.span('encode'):
+            self._writer.write(frame)
+        self._segment_frames += 1
+        self.written += 1
+
+    def _open_segment(self, frame):
+        self._close_segment()
+        path = time.strftime(self.path_pattern)
+        if os.path.exists(path):
+            root, ext = os.path.splitext(path)
+            path = f"{root}_{self.segments}{ext}"
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        height, width = frame.shape[:2]
+        self._writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*self.fourcc), self.record_fps,
+                                       (width, height))
+        if not self._writer.isOpened():
+            raise IOError(f"Không thể mở file ghi hình '{path}' (fourcc '{self.fourcc}')")
+        self._segment_frames = 0
+        self.segments += 1
+        print(f"[*] Đang ghi hình vào '{path}'.")
+
+    def _close_segment(self):
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+
+    def _report(self):
+        s = self.stats()
+        print(f"[*] Ghi hình: {s['written']} khung hình, {s['segments']} đoạn, bỏ {s['dropped']} "
+              f"(hàng đợi đầy), mã hóa TB {s['encode_ms_mean']:.1f} ms / p95 {s['encode_ms_p95']:.1f} ms.")
@@ -3,6 +3,7 @@ import numpy as np
 import json
 import os
 from itertools import combinations
+from src.slot_geometry import slot_bounding_box
 
 class SlotDetector:
     """
@@ -24,16 +25,63 @@ class SlotDetector:
         self.canny_high_thresh = self.detection_params.get('canny_high_thresh', 150)
         self.hough_rho = self.detection_params.get('hough_rho', 1)
         self.hough_theta_res = self.detection_params.get('hough_theta_res', np.pi / 180)
+        if not 0 < self.hough_theta_res <= np.pi / 4:
+            # Giá trị cũ 1.6 (radian ~ 92 độ) làm Hough chỉ xét 2 góc; không tự đoán đơn vị
+            raise ValueError(
+                f"'hough_theta_res' = {self.hough_theta_res} không hợp lệ: đơn vị là radian và phải "
+                f"trong (0, pi/4], ví dụ 0.0174533 (= pi/180, tức 1 độ). Nếu cấu hình cũ ghi 1.6, "
+                f"hãy đổi thành 0.0174533.")
         self.hough_threshold = self.detection_params.get('hough_threshold', 40) # Tăng nhẹ threshold
         self.hough_min_line_length = self.detection_params.get('hough_min_line_length', 30) # Tăng nhẹ
         self.hough_max_line_gap = self.detection_params.get('hough_max_line_gap', 5)
         
+        # Bộ tìm đoạn thẳng: 'hough' (HoughLinesP), 'morphology' (mở hình thái theo hướng)
+        # hoặc 'lsd' (Line Segment Detector, làm việc trực tiếp trên ảnh xám, không cần Canny)
+        self.line_engine = self.detection_params.get('line_engine', 'hough')
+        self._lsd = None
+        self.merge_dist_thresh = self.detection_params.get('merge_dist_thresh', 15)
+        
+        # Phát hiện thô-đến-tinh: số tầng thu nhỏ (0 = tắt) và nửa độ rộng dải tinh chỉnh
+        self.pyramid_levels = self.detection_params.get('pyramid_levels', 0)
+        self.pyramid_refine_band = self.detection_params.get('pyramid_refine_band', 0)
+        self._coarse_detector = None
+        
+        # Hình dạng ô: 'box' (hộp thẳng trục) hoặc 'quad' (tứ giác theo phối cảnh)
+        self.slot_shape = self.detection_params.get('slot_shape', 'box')
+        
+        # Cách tạo ô từ các đường: 'pairs' (duyệt mọi cặp giao điểm) hoặc 'grid' (suy luận lưới)
+        self.slot_search = self.detection_params.get('slot_search', 'pairs')
+        self.grid_bin_size = self.detection_params.get('grid_bin_size', 2)
+        self.grid_tolerance = self.detection_params.get('grid_tolerance', 0.2)
+        self.grid_max_missing = self.detection_params.get('grid_max_missing', 3)
+        self.grid_min_coverage = self.detection_params.get('grid_min_coverage', 0.0)
+        self.morph_kernel_length = self.detection_params.get('morph_kernel_length', self.hough_min_line_length)
+        self.morph_dilate = self.detection_params.get('morph_dilate', 1)
+        
         # Các tham số cho việc nhóm và tạo ô
         self.slot_width_min = self.detection_params.get('slot_width_min', 25)
         self.slot_width_max = self.detection_params.get('slot_width_max', 60)
         self.slot_height_min = self.detection_params.get('slot_height_min', 50)
         self.slot_height_max = self.detection_params.get('slot_height_max', 120)
         
+        self.config = config
+        
+        if self.pyramid_levels > 0:
+            coarse_side = min(self.slot_width_min, self.slot_height_min) / 2 ** self.pyramid_levels
+            if self.line_engine == 'morphology' and coarse_side < max(int(self.morph_kernel_length), 3):
+                # Kernel ở tầng thô không thu ngắn theo tỉ lệ (xem _scaled_config) nên cạnh ngắn
+                # nhất của ô sau khi thu nhỏ phải còn chứa được nó, nếu không vạch bị xóa mất
+                raise ValueError(
+                    f"'pyramid_levels' = {self.pyramid_levels} quá sâu cho line_engine 'morphology': "
+                    f"cạnh ô nhỏ nhất ở tầng thô chỉ còn {coarse_side:.1f} pixel, ngắn hơn "
+                    f"morph_kernel_length = {self.morph_kernel_length}. Hãy giảm pyramid_levels "
+                    f"hoặc morph_kernel_length.")
+            if self.line_engine != 'morphology' and coarse_side < self.hough_min_line_length:
+                # Hough/LSD vẫn chạy được nhưng vạch của các ô kề nhau dễ dính nhau ở tầng thô
+                print(f"[WARNING] pyramid_levels = {self.pyramid_levels}: cạnh ô nhỏ nhất ở tầng thô chỉ còn "
+                      f"{coarse_side:.1f} pixel (< hough_min_line_length = {self.hough_min_line_length}), "
+                      f"kết quả có thể kém hơn nhiều so với pyramid_levels thấp hơn. Hãy kiểm tra bằng evaluate_detector.py.")
+        
     def detect(self, video_source):
         """
         Phát hiện các ô đỗ xe từ video đầu vào.
@@ -54,23 +102,53 @@ class SlotDetector:
         if not ret:
             raise ValueError(f"Không thể đọc khung hình từ video '{video_source}'")
         
-        edges = self._preprocess_frame_for_lines(frame)
-        lines = self._detect_lines(edges)
+        parking_slots = self.detect_in_frame(frame)
         
-        if lines is None:
-            print("[WARNING] Không tìm thấy đường thẳng nào. Hãy thử giảm 'hough_threshold' trong config.")
-            return []
+        print(f"[*] Đã phát hiện được {len(parking_slots)} ô đỗ xe sau khi lọc.")
+        
+        return parking_slots
+
+    def detect_in_frame(self, frame, verbose=True):
+        """
+        Chạy toàn bộ pipeline phát hiện trên một khung hình.
+        
+        Args:
+            frame: Khung hình BGR
+            verbose: In cảnh báo khi không tìm thấy đường thẳng / ô
             
-        vertical_lines, horizontal_lines = self._classify_lines(lines)
+        Returns:
+            List các tọa độ ô đỗ xe dưới dạng [x1, y1, x2, y2]
+        """
+        if self.pyramid_levels > 0:
+            merged = self._find_lines_coarse_to_fine(frame)
+        else:
+            merged = self._find_merged_lines(frame)
         
-        # Hợp nhất các đường thẳng gần nhau để giảm nhiễu
-        vertical_lines = self._merge_lines(vertical_lines, 'vertical')
-        horizontal_lines = self._merge_lines(horizontal_lines, 'horizontal')
+        if merged is None:
+            if verbose:
+                print("[WARNING] Không tìm thấy đường thẳng nào. Hãy thử giảm 'hough_threshold' trong config.")
+            return []
+        vertical_lines, horizontal_lines = merged
 
         # === THAY ĐỔI QUAN TRỌNG Ở ĐÂY ===
-        parking_slots = self._find_slots_from_intersections(vertical_lines, horizontal_lines)
+        parking_slots = []
+        if self.slot_shape == 'quad':
+            # Ô tứ giác từ giao điểm thực của các đoạn nghiêng (camera chụp xiên)
+            parking_slots = self._find_quads_from_intersections(vertical_lines, horizontal_lines)
+        elif self.slot_search == 'grid':
+            # Suy luận lưới tuần hoàn; chỉ gộp thêm ô tìm theo cặp khi được bật bằng
+            # grid_min_coverage và lưới giải thích quá ít đường
+            parking_slots, coverage = self._find_slots_from_grid(vertical_lines, horizontal_lines)
+            if verbose:
+                print(f"[*] Lưới: {len(parking_slots)} ô, giải thích {coverage:.0%} chiều dài đường.")
+            if coverage < self.grid_min_coverage:
+                if verbose:
+                    print(f"[*] Độ phủ dưới grid_min_coverage = {self.grid_min_coverage:.0%}, gộp thêm ô tìm theo cặp.")
+                parking_slots = parking_slots + self._find_slots_from_intersections(vertical_lines, horizontal_lines)
+        else:
+            parking_slots = self._find_slots_from_intersections(vertical_lines, horizontal_lines)
         
-        if not parking_slots:
+        if not parking_slots and verbose:
             print("[WARNING] Không tìm thấy ô nào từ giao điểm. Quay lại logic cũ đơn giản hơn để thử...")
             # Nếu logic mới không hoạt động, có thể thử lại logic cũ (dù ít hiệu quả hơn)
             # Hoặc đơn giản là báo lỗi và yêu cầu tinh chỉnh tham số
@@ -78,26 +156,210 @@ class SlotDetector:
 
         # Lọc bỏ các ô trùng lặp
         if parking_slots:
-            parking_slots = self._non_max_suppression(np.array(parking_slots), 0.3)
+            parking_slots = self._suppress_slots(parking_slots)
         
-        print(f"[*] Đã phát hiện được {len(parking_slots)} ô đỗ xe sau khi lọc.")
+        return parking_slots
+
+    def _find_merged_lines(self, frame):
+        """
+        Tìm, phân loại và hợp nhất đoạn thẳng ở độ phân giải của `frame`.
         
-        return parking_slots.tolist() if isinstance(parking_slots, np.ndarray) else parking_slots
+        Returns:
+            Tuple (đường dọc, đường ngang) đã hợp nhất, hoặc None nếu không có đoạn nào
+        """
+        edges = self._preprocess_frame_for_lines(frame)
+        lines = self._detect_lines(edges)
+        if lines is None:
+            return None
+            
+        vertical_lines, horizontal_lines = self._classify_lines(lines)
+        
+        # Hợp nhất các đường thẳng gần nhau để giảm nhiễu; ô tứ giác cần giữ độ nghiêng,
+        # lưới cần giữ đầu mút của từng vạch
+        if self.slot_shape == 'quad':
+            merge = self._merge_lines_fitted
+        elif self.slot_search == 'grid':
+            merge = self._merge_lines_local
+        else:
+            merge = self._merge_lines
+        vertical_lines = merge(vertical_lines, 'vertical', self.merge_dist_thresh)
+        horizontal_lines = merge(horizontal_lines, 'horizontal', self.merge_dist_thresh)
+        return vertical_lines, horizontal_lines
+
+    def _find_lines_coarse_to_fine(self, frame):
+        """
+        Tìm đường thẳng trên tầng thu nhỏ của kim tự tháp ảnh, sau đó tinh chỉnh vị trí
+        từng đường ở độ phân giải gốc trong một dải hẹp quanh đường thô. Canny và
+        Hough không còn chạy trên toàn khung hình gốc.
+        
+        Returns:
+            Tuple (đường dọc, đường ngang) ở tọa độ gốc, hoặc None nếu không có đoạn nào
+        """
+        coarse = frame
+        for _ in range(self.pyramid_levels):
+            coarse = cv2.pyrDown(coarse)
+        scale_x = frame.shape[1] / coarse.shape[1]
+        scale_y = frame.shape[0] / coarse.shape[0]
+        
+        merged = self._get_coarse_detector()._find_merged_lines(coarse)
+        if merged is None:
+            return None
+        
+        if self.slot_shape == 'quad':
+            # Đường nghiêng: chỉ phóng to tọa độ đầu mút, không tinh chỉnh theo trục
+            return tuple(
+                [[int(x1 * scale_x), int(y1 * scale_y), int(x2 * scale_x), int(y2 * scale_y)]
+                 for x1, y1, x2, y2 in lines]
+                for lines in merged
+            )
+        
+        frame_h, frame_w = frame.shape[:2]
+        band = self.pyramid_refine_band or 2 ** (self.pyramid_levels + 1)
+        vertical_lines = []
+        for x1, y1, _, y2 in merged[0]:
+            x = self._refine_line_position(frame, int(x1 * scale_x), int(y1 * scale_y), int(y2 * scale_y), band, 'vertical')
+            vertical_lines.append([x, int(y1 * scale_y), x, min(int(y2 * scale_y), frame_h - 1)])
+        horizontal_lines = []
+        for x1, y1, x2, _ in merged[1]:
+            y = self._refine_line_position(frame, int(y1 * scale_y), int(x1 * scale_x), int(x2 * scale_x), band, 'horizontal')
+            horizontal_lines.append([int(x1 * scale_x), y, min(int(x2 * scale_x), frame_w - 1), y])
+        return vertical_lines, horizontal_lines
+
+    def _get_coarse_detector(self):
+        """Bộ phát hiện (tạo một lần) chạy trên tầng thu nhỏ của kim tự tháp ảnh."""
+        if self._coarse_detector is None:
+            self._coarse_detector = SlotDetector(self._scaled_config(1.0 / 2 ** self.pyramid_levels))
+        return self._coarse_detector
+
+    def _refine_line_position(self, frame, position, start, end, band, orientation):
+        """
+        Tinh chỉnh tọa độ ngang (đường dọc) hoặc dọc (đường ngang) của một đường thô
+        bằng cách chạy Canny trong dải [position - band, position + band] ở độ phân giải
+        gốc và lấy trọng tâm của các cột/hàng có nhiều điểm cạnh nhất.
+        """
+        if orientation == 'vertical':
+            lo, hi = max(position - band, 0), min(position + band + 1, frame.shape[1])
+            crop = frame[max(start, 0):end + 1, lo:hi]
+            axis = 0
+        else:
+            lo, hi = max(position - band, 0), min(position + band + 1, frame.shape[0])
+            crop = frame[lo:hi, max(start, 0):end + 1]
+            axis = 1
+        if crop.size == 0:
+            return position
+        
+        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+        edges = cv2.Canny(cv2.GaussianBlur(gray, (5, 5), 0), self.canny_low_thresh, self.canny_high_thresh)
+        profile = np.count_nonzero(edges, axis=axis).astype(np.float64)
+        if profile.max() == 0:
+            return position
+        
+        # Hai mép của vạch sơn đều mạnh; bỏ các cột/hàng nhiễu yếu hơn một nửa đỉnh
+        profile[profile < 0.5 * profile.max()] = 0
+        offsets = np.arange(len(profile))
+        return int(round(lo + np.dot(offsets, profile) / profile.sum()))
+
+    def _scaled_config(self, factor):
+        """Bản sao cấu hình với các tham số tính bằng pixel được nhân với `factor`."""
+        params = dict(self.detection_params)
+        for key in ('hough_min_line_length', 'hough_max_line_gap',
+                    'slot_width_min', 'slot_width_max', 'slot_height_min', 'slot_height_max'):
+            params[key] = max(1, int(round(getattr(self, key) * factor)))
+        # Kernel mở hình thái giữ nguyên độ dài cấu hình: thu ngắn theo tỉ lệ làm vết cạnh xe
+        # và nhiễu sống sót rồi bị gộp chuỗi với vạch phân cách (recall 4K ở tầng 2 còn 0.10)
+        params['morph_kernel_length'] = self.morph_kernel_length
+        params['hough_threshold'] = max(1, int(round(self.hough_threshold * factor)))
+        params['merge_dist_thresh'] = max(2, int(round(self.merge_dist_thresh * factor)))
+        params['hough_theta_res'] = self.hough_theta_res
+        params['pyramid_levels'] = 0
+        return {**self.config, 'detection_params': params}
 
     def _preprocess_frame_for_lines(self, frame):
-        """Tiền xử lý ảnh để phát hiện cạnh."""
+        """
+        Tiền xử lý ảnh để phát hiện cạnh.
+        
+        Với `line_engine: lsd` trả về ảnh xám vì LSD tự tính gradient, bỏ qua bước Canny.
+        """
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if self.line_engine == 'lsd':
+            return gray
         blurred = cv2.GaussianBlur(gray, (5, 5), 0)
         edges = cv2.Canny(blurred, self.canny_low_thresh, self.canny_high_thresh)
         return edges
 
     def _detect_lines(self, edges):
+        """
+        Phát hiện đoạn thẳng bằng bộ tìm được chọn trong `line_engine`.
+        
+        Returns:
+            Mảng (N, 1, 4) các đoạn [x1, y1, x2, y2] hoặc None nếu không có đoạn nào
+        """
+        if self.line_engine == 'hough':
+            return self._detect_lines_hough(edges)
+        if self.line_engine == 'morphology':
+            return self._detect_lines_morphology(edges)
+        if self.line_engine == 'lsd':
+            return self._detect_lines_lsd(edges)
+        raise ValueError(f"'line_engine' không hợp lệ: '{self.line_engine}'")
+
+    def _detect_lines_hough(self, edges):
         """Sử dụng Hough Transform để phát hiện đoạn thẳng."""
         lines = cv2.HoughLinesP(
             edges, self.hough_rho, self.hough_theta_res, self.hough_threshold,
             minLineLength=self.hough_min_line_length, maxLineGap=self.hough_max_line_gap
         )
         return lines
+
+    def _detect_lines_morphology(self, edges):
+        """
+        Tìm trực tiếp các đoạn ngang và dọc bằng phép mở hình thái với kernel dài
+        1 x k và k x 1, sau đó lấy mỗi thành phần liên thông làm một đoạn thẳng.
+        
+        Chỉ đường gần ngang/dọc được giữ lại, đúng với những gì `_classify_lines`
+        sử dụng, nên không phải quét mọi góc như HoughLinesP.
+        """
+        if self.morph_dilate > 0:
+            # Nối các cạnh bị răng cưa 1 pixel để phép mở không làm đứt đoạn
+            edges = cv2.dilate(edges, np.ones((3, 3), np.uint8), iterations=self.morph_dilate)
+        
+        k = max(int(self.morph_kernel_length), 3)
+        horizontal_mask = cv2.morphologyEx(edges, cv2.MORPH_OPEN, np.ones((1, k), np.uint8))
+        vertical_mask = cv2.morphologyEx(edges, cv2.MORPH_OPEN, np.ones((k, 1), np.uint8))
+        
+        _, _, h_stats, _ = cv2.connectedComponentsWithStats(horizontal_mask, connectivity=8)
+        _, _, v_stats, _ = cv2.connectedComponentsWithStats(vertical_mask, connectivity=8)
+        h_stats, v_stats = h_stats[1:], v_stats[1:]  # Bỏ nhãn nền
+        
+        if len(h_stats) + len(v_stats) == 0:
+            return None
+        
+        # Đoạn ngang đi qua tâm theo y, đoạn dọc đi qua tâm theo x của thành phần
+        x, y, w, h = (h_stats[:, i] for i in range(4))
+        cy = y + h // 2
+        horizontal = np.stack([x, cy, x + w - 1, cy], axis=1)
+        x, y, w, h = (v_stats[:, i] for i in range(4))
+        cx = x + w // 2
+        vertical = np.stack([cx, y, cx, y + h - 1], axis=1)
+        
+        return np.concatenate([horizontal, vertical]).astype(np.int32).reshape(-1, 1, 4)
+        
+    def _detect_lines_lsd(self, gray):
+        """
+        Sử dụng Line Segment Detector trên ảnh xám. LSD không cần ngưỡng Canny/Hough;
+        chỉ giữ các đoạn dài hơn `hough_min_line_length` như HoughLinesP.
+        """
+        if self._lsd is None:
+            self._lsd = cv2.createLineSegmentDetector(cv2.LSD_REFINE_STD)
+        lines = self._lsd.detect(gray)[0]
+        if lines is None:
+            return None
+        
+        lines = np.rint(lines.reshape(-1, 4)).astype(np.int32)
+        lengths = np.hypot(lines[:, 2] - lines[:, 0], lines[:, 3] - lines[:, 1])
+        lines = lines[lengths >= self.hough_min_line_length]
+        if len(lines) == 0:
+            return None
+        return lines.reshape(-1, 1, 4)
         
     def _classify_lines(self, lines, angle_thresh=np.pi/6): # Nới lỏng góc một chút
         """Phân loại đường thẳng thành dọc và ngang."""
@@ -202,11 +464,370 @@ class SlotDetector:
 
         return slots
         
+    def _merge_lines_fitted(self, lines, orientation, dist_thresh=15):
+        """
+        Giống `_merge_lines` nhưng giữ độ nghiêng: mỗi nhóm được thay bằng đường
+        khớp bình phương tối thiểu qua các đầu mút (x theo y cho đường dọc, y theo x
+        cho đường ngang) thay vì ép về trục.
+        """
+        if not lines:
+            return []
+        
+        axis = 0 if orientation == 'vertical' else 1
+        lines = np.array(sorted(lines, key=lambda line: line[axis]), dtype=np.float64)
+        # Tách nhóm tại những chỗ khoảng cách tới đường trước đó >= dist_thresh
+        splits = np.where(np.abs(np.diff(lines[:, axis])) >= dist_thresh)[0] + 1
+        
+        merged_lines = []
+        for group in np.split(lines, splits):
+            xs = np.concatenate([group[:, 0], group[:, 2]])
+            ys = np.concatenate([group[:, 1], group[:, 3]])
+            if orientation == 'vertical':
+                # x = a*y + b; nhóm chỉ có một tung độ thì coi như thẳng đứng
+                a, b = np.polyfit(ys, xs, 1) if np.ptp(ys) > 0 else (0.0, xs.mean())
+                y1, y2 = ys.min(), ys.max()
+                merged_lines.append([int(round(a * y1 + b)), int(y1), int(round(a * y2 + b)), int(y2)])
+            else:
+                a, b = np.polyfit(xs, ys, 1) if np.ptp(xs) > 0 else (0.0, ys.mean())
+                x1, x2 = xs.min(), xs.max()
+                merged_lines.append([int(x1), int(round(a * x1 + b)), int(x2), int(round(a * x2 + b))])
+        return merged_lines
+
+    def _find_quads_from_intersections(self, vertical_lines, horizontal_lines):
+        """
+        Tìm các ô tứ giác từ giao điểm thực (vector hóa) của các đoạn gần dọc và gần ngang,
+        dùng cho các hàng ô bị nghiêng do phối cảnh camera.
+        
+        Returns:
+            List các đa giác [[x, y], [x, y], [x, y], [x, y]] theo thứ tự
+            trên-trái, trên-phải, dưới-phải, dưới-trái
+        """
+        if len(vertical_lines) < 2 or len(horizontal_lines) < 2:
+            return []
+        
+        v = np.asarray(vertical_lines, dtype=np.float64)
+        h = np.asarray(horizontal_lines, dtype=np.float64)
+        # Sắp xếp theo trung điểm để cặp (i < j) luôn là (trái, phải) / (trên, dưới)
+        v = v[np.argsort((v[:, 0] + v[:, 2]) / 2)]
+        h = h[np.argsort((h[:, 1] + h[:, 3]) / 2)]
+        
+        # Giao điểm mọi cặp (dọc, ngang) qua tích có hướng của tọa độ thuần nhất
+        def homogeneous(lines):
+            p1 = np.column_stack([lines[:, 0], lines[:, 1], np.ones(len(lines))])
+            p2 = np.column_stack([lines[:, 2], lines[:, 3], np.ones(len(lines))])
+            return np.cross(p1, p2)
+        
+        cross = np.cross(homogeneous(v)[:, None, :], homogeneous(h)[None, :, :])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            points = cross[..., :2] / cross[..., 2:3]   # (V, H, 2)
+        
+        # Điểm giao phải nằm trên (hoặc gần) cả hai đoạn: khoảng vượt ra ngoài đầu mút
+        # không quá một nửa kích thước ô nhỏ nhất, tương tự điều kiện chồng lấn 50%
+        def overshoot(lines, line_axis):
+            start = lines[:, :2]
+            direction = lines[:, 2:] - lines[:, :2]
+            if line_axis == 0:
+                start, direction = start[:, None, :], direction[:, None, :]
+            else:
+                start, direction = start[None, :, :], direction[None, :, :]
+            length_sq = np.maximum((direction ** 2).sum(-1), 1e-9)
+            t = ((points - start) * direction).sum(-1) / length_sq
+            return np.maximum(0, np.maximum(-t, t - 1)) * np.sqrt(length_sq)
+        
+        gap = 0.5 * min(self.slot_width_min, self.slot_height_min)
+        with np.errstate(invalid='ignore'):
+            valid = np.isfinite(points).all(-1) & (overshoot(v, 0) <= gap) & (overshoot(h, 1) <= gap)
+        
+        # Lọc trước các cặp đường dọc/ngang theo khoảng cách ở trung điểm
+        vi, vj = np.triu_indices(len(v), 1)
+        width = np.abs((v[vj, 0] + v[vj, 2]) - (v[vi, 0] + v[vi, 2])) / 2
+        keep = (width > self.slot_width_min * 0.5) & (width < self.slot_width_max * 1.5)
+        vi, vj = vi[keep], vj[keep]
+        hk, hl = np.triu_indices(len(h), 1)
+        height = np.abs((h[hl, 1] + h[hl, 3]) - (h[hk, 1] + h[hk, 3])) / 2
+        keep = (height > self.slot_height_min * 0.5) & (height < self.slot_height_max * 1.5)
+        hk, hl = hk[keep], hl[keep]
+        if len(vi) == 0 or len(hk) == 0:
+            return []
+        
+        quads = []
+        # Xử lý theo từng lô cặp đường dọc để giới hạn bộ nhớ
+        chunk = max(1, 200000 // len(hk))
+        for start in range(0, len(vi), chunk):
+            a, b = vi[start:start + chunk, None], vj[start:start + chunk, None]
+            c, d = hk[None, :], hl[None, :]
+            ok = valid[a, c] & valid[b, c] & valid[b, d] & valid[a, d]
+            tl, tr, br, bl = points[a, c], points[b, c], points[b, d], points[a, d]
+            with np.errstate(invalid='ignore'):
+                w = (np.linalg.norm(tr - tl, axis=-1) + np.linalg.norm(br - bl, axis=-1)) / 2
+                ht = (np.linalg.norm(bl - tl, axis=-1) + np.linalg.norm(br - tr, axis=-1)) / 2
+                ok &= (self.slot_width_min < w) & (w < self.slot_width_max)
+                ok &= (self.slot_height_min < ht) & (ht < self.slot_height_max)
+            rows, cols = np.nonzero(ok)
+            if len(rows) == 0:
+                continue
+            corners = np.stack([tl[rows, cols], tr[rows, cols], br[rows, cols], bl[rows, cols]], axis=1)
+            quads.extend(np.rint(corners).astype(int).tolist())
+        return quads
+
+    def _merge_lines_local(self, lines, orientation, dist_thresh=15):
+        """
+        Hợp nhất cục bộ dùng cho `slot_search: grid`: hai đoạn chỉ thuộc cùng một vạch
+        khi vị trí theo trục vuông góc cách < `dist_thresh` và khoảng hở dọc theo đường
+        không lớn hơn kích thước ô nhỏ nhất theo hướng đó.
+        
+        `_merge_lines` nối chuỗi mọi đoạn có vị trí gần nhau trên toàn khung hình, nên
+        các vạch ngắn của những hàng khác nhau (hoặc cạnh xe) cùng x / cùng y bị gộp thành
+        một đường dài và mất đầu mút mà lưới cần để xác định dải.
+        """
+        if len(lines) == 0:
+            return []
+        
+        lines = np.asarray(lines, dtype=np.int64).reshape(-1, 4)
+        if orientation == 'vertical':
+            pos, along, gap = lines[:, 0], lines[:, [1, 3]], self.slot_height_min
+        else:
+            pos, along, gap = lines[:, 1], lines[:, [0, 2]], self.slot_width_min
+        lo, hi = along.min(axis=1), along.max(axis=1)
+        
+        # Cặp nối được: dịch mảng đã sắp xếp theo vị trí đi k bước cho tới khi không
+        # còn cặp nào cách < dist_thresh
+        order = np.argsort(pos, kind='stable')
+        pos_sorted, lo_sorted, hi_sorted = pos[order], lo[order], hi[order]
+        parent = np.arange(len(lines))
+        
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+        
+        for k in range(1, len(lines)):
+            near = pos_sorted[k:] - pos_sorted[:-k] < dist_thresh
+            if not near.any():
+                break
+            near &= np.maximum(lo_sorted[k:], lo_sorted[:-k]) - np.minimum(hi_sorted[k:], hi_sorted[:-k]) <= gap
+            for a in np.flatnonzero(near):
+                root_i, root_j = find(order[a]), find(order[a + k])
+                if root_i != root_j:
+                    parent[root_j] = root_i
+        
+        roots = np.array([find(i) for i in range(len(lines))])
+        merged_lines = []
+        for root in np.unique(roots):
+            group = roots == root
+            # Vị trí = trung bình theo độ dài đoạn, nên một vạch bị đứt vẫn cho cùng vị trí
+            weights = hi[group] - lo[group] + 1
+            avg = int(np.dot(weights, pos[group]) // weights.sum())
+            if orientation == 'vertical':
+                merged_lines.append([avg, int(lo[group].min()), avg, int(hi[group].max())])
+            else:
+                merged_lines.append([int(lo[group].min()), avg, int(hi[group].max()), avg])
+        axis = 0 if orientation == 'vertical' else 1
+        return sorted(merged_lines, key=lambda line: (line[axis], line))
+
+    def _find_slots_from_grid(self, vertical_lines, horizontal_lines):
+        """
+        Tạo các ô từ cấu trúc lưới tuần hoàn của bãi đỗ (chi phí gần tuyến tính theo số đường).
+        
+        Hàng ô nằm ngang: các vạch dọc có cùng hai đầu mút tạo thành một dải, bước chủ đạo
+        giữa các vạch trong dải được ước lượng bằng histogram, rồi các vạch bị xe che được
+        điền vào theo bước lưới. Hàng ô xếp dọc được xử lý đối xứng bằng cách hoán đổi trục
+        x/y. Không cần vạch ngang chạy dọc hàng, nên hàng hở một đầu (phía lối đi) vẫn được
+        nhận ra.
+        
+        Returns:
+            Tuple (list các ô [x1, y1, x2, y2], độ phủ): độ phủ là tỷ lệ chiều dài đường
+            nằm trên cạnh của một ô lưới, lấy theo hướng được giải thích tốt hơn (hướng còn
+            lại chứa cả mép xe và vạch dọc lối đi, vốn không phải vạch phân cách)
+        """
+        slots, row_separators = self._grid_rows(
+            vertical_lines, (self.slot_width_min, self.slot_width_max),
+            (self.slot_height_min, self.slot_height_max))
+        
+        swap = lambda lines: [[l[1], l[0], l[3], l[2]] for l in lines]
+        column_slots, column_separators = self._grid_rows(
+            swap(horizontal_lines), (self.slot_height_min, self.slot_height_max),
+            (self.slot_width_min, self.slot_width_max))
+        slots.extend(swap(column_slots))
+        
+        vertical = np.asarray(vertical_lines, dtype=np.int64).reshape(-1, 4)
+        horizontal = np.asarray(horizontal_lines, dtype=np.int64).reshape(-1, 4)
+        vertical_length = np.abs(vertical[:, 3] - vertical[:, 1])
+        horizontal_length = np.abs(horizontal[:, 2] - horizontal[:, 0])
+        coverage = max(vertical_length[row_separators].sum() / max(vertical_length.sum(), 1),
+                       horizontal_length[column_separators].sum() / max(horizontal_length.sum(), 1))
+        return slots, float(coverage)
+
+    def _grid_rows(self, separators, pitch_range, band_range):
+        """
+        Tìm các hàng ô có vạch phân cách là các đường `separators` (dọc).
+        
+        Một vạch dài đúng một chiều cao ô cho một đoạn ứng viên; vạch dài gấp đôi (hai hàng
+        quay lưng vào nhau dùng chung vạch) cho hai đoạn, mỗi nửa một hàng. Các đoạn có đầu
+        mút trên và dưới lệch nhau không quá `grid_tolerance` lần chiều cao ô nhỏ nhất được
+        gom thành một dải. Các dải chồng lên nhau được chọn tham lam theo số vạch, theo từng
+        vòng vector hóa: mỗi vòng nhận mọi dải tốt hơn tất cả các dải chưa quyết định chồng
+        lên nó, rồi loại các dải chồng lên dải vừa nhận (cùng kết quả với duyệt tuần tự).
+        
+        Args:
+            separators: Các đường dọc đã hợp nhất [x, y1, x, y2]
+            pitch_range: (min, max) của bề rộng ô theo trục x
+            band_range: (min, max) của chiều cao ô theo trục y
+            
+        Returns:
+            Tuple (list các ô [x1, y1, x2, y2], mảng bool các đường dọc nằm trên cạnh ô)
+        """
+        used = np.zeros(len(separators), dtype=bool)
+        if len(separators) < 2:
+            return [], used
+        
+        separators = np.asarray(separators, dtype=np.int64).reshape(-1, 4)
+        lo = np.minimum(separators[:, 1], separators[:, 3])
+        hi = np.maximum(separators[:, 1], separators[:, 3])
+        length = hi - lo
+        index, seg_y1, seg_y2 = [], [], []
+        for parts in (1, 2):
+            fits = np.flatnonzero((length > band_range[0] * parts) & (length < band_range[1] * parts))
+            for part in range(parts):
+                index.append(fits)
+                seg_y1.append(lo[fits] + length[fits] * part // parts)
+                seg_y2.append(lo[fits] + length[fits] * (part + 1) // parts)
+        index, seg_y1, seg_y2 = (np.concatenate(a) for a in (index, seg_y1, seg_y2))
+        if len(index) < 2:
+            return [], used
+        
+        # Gom đoạn thành dải: tách chuỗi theo đầu mút trên, rồi trong mỗi nhóm theo đầu mút dưới
+        tolerance = self.grid_tolerance * band_range[0]
+        order = np.argsort(seg_y1, kind='stable')
+        top_group = np.concatenate(([0], np.cumsum(np.diff(seg_y1[order]) > tolerance)))
+        order = order[np.lexsort((seg_y2[order], top_group))]
+        top_group = np.sort(top_group)
+        breaks = (np.diff(top_group) > 0) | (np.diff(seg_y2[order]) > tolerance)
+        band = np.concatenate(([0], np.cumsum(breaks)))
+        # Trong mỗi dải, các vạch sắp theo x
+        order = order[np.lexsort((separators[index[order], 0], band))]
+        index, seg_y1, seg_y2 = index[order], seg_y1[order], seg_y2[order]
+        x = separators[index, 0]
+        
+        starts = np.flatnonzero(np.concatenate(([True], np.diff(band) > 0)))
+        counts = np.diff(np.append(starts, len(band)))
+        band_y1 = np.rint(np.add.reduceat(seg_y1, starts) / counts).astype(np.int64)
+        band_y2 = np.rint(np.add.reduceat(seg_y2, starts) / counts).astype(np.int64)
+        band_x1, band_x2 = x[starts], x[starts + counts - 1]
+        # Dải hợp lệ phải có ít nhất một cặp vạch liền kề cách nhau đúng một bề rộng ô
+        diffs = np.diff(x)
+        pitched = (np.diff(band) == 0) & (diffs > pitch_range[0]) & (diffs < pitch_range[1])
+        candidates = np.flatnonzero(np.bincount(band[1:][pitched], minlength=len(starts)) > 0)
+        if len(candidates) == 0:
+            return [], used
+        
+        # Cặp dải chồng nhau: hơn nửa chiều cao theo y và có phần chung theo x. Sắp theo cạnh
+        # trên, mỗi dải chỉ cần so với các dải bắt đầu trước cạnh dưới của nó
+        candidates = candidates[np.argsort(band_y1[candidates], kind='stable')]
+        y1, y2 = band_y1[candidates], band_y2[candidates]
+        x1, x2 = band_x1[candidates], band_x2[candidates]
+        height = y2 - y1
+        window = np.searchsorted(y1, y2, side='left') - np.arange(len(candidates)) - 1
+        window = np.maximum(window, 0)
+        a = np.repeat(np.arange(len(candidates)), window)
+        b = a + 1 + np.arange(window.sum()) - np.repeat(np.cumsum(window) - window, window)
+        overlap = ((np.minimum(y2[a], y2[b]) - np.maximum(y1[a], y1[b]) > 0.5 * np.minimum(height[a], height[b])) &
+                   (np.minimum(x2[a], x2[b]) > np.maximum(x1[a], x1[b])))
+        a, b = np.concatenate((a[overlap], b[overlap])), np.concatenate((b[overlap], a[overlap]))
+        
+        rank = np.empty(len(candidates), dtype=np.int64)
+        rank[np.lexsort((y1, height, -counts[candidates]))] = np.arange(len(candidates))
+        state = np.zeros(len(candidates), dtype=np.int8)   # 0 chưa quyết định, 1 nhận, -1 loại
+        while (state == 0).any():
+            undecided = state == 0
+            live = undecided[a] & undecided[b]
+            best_neighbour = np.full(len(candidates), len(candidates))
+            np.minimum.at(best_neighbour, a[live], rank[b[live]])
+            accepted = undecided & (rank < best_neighbour)
+            state[accepted] = 1
+            rejected = np.zeros(len(candidates), dtype=bool)
+            rejected[a[accepted[b]]] = True
+            state[rejected & (state == 0)] = -1
+        
+        slots = []
+        for k in np.flatnonzero(state == 1):
+            start, stop = starts[candidates[k]], starts[candidates[k]] + counts[candidates[k]]
+            xs = np.unique(x[start:stop])
+            boundaries = self._grid_boundaries(xs, xs[0], xs[-1], pitch_range)
+            band_slots = [[int(bx1), int(y1[k]), int(bx2), int(y2[k])]
+                          for bx1, bx2 in zip(boundaries[:-1], boundaries[1:])
+                          if pitch_range[0] < bx2 - bx1 < pitch_range[1]]
+            if band_slots:
+                slots.extend(band_slots)
+                members = index[start:stop]
+                used[members[(x[start:stop] >= band_slots[0][0]) & (x[start:stop] <= band_slots[-1][2])]] = True
+        return slots, used
+
+    def _grid_boundaries(self, xs, extent_lo, extent_hi, pitch_range):
+        """
+        Ước lượng bước lưới chủ đạo của các vạch `xs` trong một dải rồi trả về danh sách
+        vạch phân cách đã điền thêm các vạch bị che (tối đa `grid_max_missing` vạch liên tiếp),
+        kể cả ở hai đầu dải trong phạm vi [extent_lo, extent_hi].
+        """
+        if len(xs) < 2:
+            return list(xs)
+        diffs = np.diff(xs)
+        valid = diffs[(diffs > pitch_range[0]) & (diffs < pitch_range[1])]
+        if len(valid) == 0:
+            return list(xs)
+        
+        # Mode của histogram khoảng cách, sau đó làm mịn bằng mọi khoảng cách là bội của bước
+        bins = np.arange(pitch_range[0], pitch_range[1] + self.grid_bin_size, self.grid_bin_size)
+        hist, edges = np.histogram(valid, bins=bins)
+        mode = 0.5 * (edges[np.argmax(hist)] + edges[np.argmax(hist) + 1])
+        pitch = float(np.median(valid[np.abs(valid - mode) <= self.grid_bin_size]))
+        multiples = np.rint(diffs / pitch)
+        fits = (multiples >= 1) & (np.abs(diffs - multiples * pitch) <= self.grid_tolerance * pitch)
+        if fits.any():
+            pitch = float(diffs[fits].sum() / multiples[fits].sum())
+        tolerance = self.grid_tolerance * pitch
+        max_steps = self.grid_max_missing + 1
+        
+        boundaries = [float(xs[0])]
+        for x in xs[1:]:
+            gap = x - boundaries[-1]
+            steps = int(round(gap / pitch))
+            if steps == 0:
+                continue
+            if steps <= max_steps and abs(gap - steps * pitch) <= tolerance:
+                # Khoảng trống là bội của bước lưới: điền các vạch bị xe che
+                boundaries.extend(boundaries[-1] + gap * k / steps for k in range(1, steps))
+            boundaries.append(float(x))
+        
+        # Kéo dài lưới tới hai đầu dải nếu vạch ở đầu hàng bị che
+        for _ in range(self.grid_max_missing):
+            if boundaries[0] - pitch < extent_lo - tolerance:
+                break
+            boundaries.insert(0, boundaries[0] - pitch)
+        for _ in range(self.grid_max_missing):
+            if boundaries[-1] + pitch > extent_hi + tolerance:
+                break
+            boundaries.append(boundaries[-1] + pitch)
+        return [int(round(b)) for b in boundaries]
+        
+    def _suppress_slots(self, slots):
+        """Lọc các ô trùng lặp; ô đa giác được so sánh qua hộp bao của chúng."""
+        if self.slot_shape != 'quad':
+            return self._non_max_suppression(np.array(slots), 0.3).tolist()
+        boxes = np.array([slot_bounding_box(slot) for slot in slots])
+        return [slots[i] for i in self._non_max_suppression_indices(boxes, 0.3)]
+
     def _non_max_suppression(self, boxes, overlapThresh):
         """Lọc bỏ các ô bị trùng lặp nhiều."""
         if len(boxes) == 0:
             return []
         
+        pick = self._non_max_suppression_indices(boxes, overlapThresh)
+        return boxes[pick].astype("int")
+
+    def _non_max_suppression_indices(self, boxes, overlapThresh):
+        """Chỉ số các hộp được giữ lại sau NMS."""
         pick = []
         x1 = boxes[:, 0]
         y1 = boxes[:, 1]
@@ -233,17 +854,22 @@ class SlotDetector:
             
             idxs = np.delete(idxs, np.concatenate(([last], np.where(overlap > overlapThresh)[0])))
             
-        return boxes[pick].astype("int")
+        return pick
 
-    def save_slots(self, slots, path):
-        """Lưu danh sách ô đỗ xe vào file JSON."""
+    def save_slots(self, slots, path, frame_size=None):
+        """
+        Lưu danh sách ô đỗ xe vào file JSON, kèm độ phân giải tham chiếu
+        `frame_size` (rộng, cao) của khung hình đã dùng để phát hiện nếu có.
+        """
         os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = slots if frame_size is None else {'reference_size': list(frame_size), 'slots': slots}
         with open(path, 'w') as f:
-            json.dump(slots, f)
+            json.dump(data, f)
     
     def load_slots(self, path):
-        """Tải danh sách ô đỗ xe từ file JSON."""
+        """Tải danh sách ô đỗ xe từ file JSON (cả định dạng cũ lẫn định dạng có độ phân giải)."""
         if not os.path.exists(path):
             return []
         with open(path, 'r') as f:
-            return json.load(f)
\ No newline at end of file
+            data = json.load(f)
+        return data.get('slots', []) if isinstance(data, dict) else data
@@ -0,0 +1,114 @@
+import cv2
+import numpy as np
+
+
+def is_polygon_slot(slot):
+    """Ô dạng đa giác [[x, y], ...] thay vì hộp [x1, y1, x2, y2]."""
+    if isinstance(slot, dict):
+        return False
+    return len(slot) > 0 and isinstance(slot[0], (list, tuple, np.ndarray))
+
+
+def is_rotated_rect_slot(slot):
+    """Ô dạng hình chữ nhật xoay {'center': [cx, cy], 'size': [w, h], 'angle': độ}."""
+    return isinstance(slot, dict)
+
+
+def slot_polygon(slot):
+    """
+    Các đỉnh (N, 2) của một ô ở bất kỳ định dạng nào.
+    
+    Args:
+        slot: Hộp [x1, y1, x2, y2], đa giác [[x, y], ...] hoặc hình chữ nhật xoay
+    """
+    if is_rotated_rect_slot(slot):
+        rect = (tuple(slot['center']), tuple(slot['size']), slot.get('angle', 0))
+        return cv2.boxPoints(rect)
+    if is_polygon_slot(slot):
+        return np.asarray(slot, dtype=np.float32)
+    x1, y1, x2, y2 = slot
+    return np.array([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], dtype=np.float32)
+
+
+def slot_bounding_box(slot):
+    """
+    Hộp bao [x1, y1, x2, y2] của một ô.
+    
+    Args:
+        slot: Hộp [x1, y1, x2, y2], đa giác [[x, y], ...] hoặc hình chữ nhật xoay
+    """
+    if is_polygon_slot(slot) or is_rotated_rect_slot(slot):
+        points = np.rint(slot_polygon(slot))
+        return [int(points[:, 0].min()), int(points[:, 1].min()),
+                int(points[:, 0].max()), int(points[:, 1].max())]
+    return [int(v) for v in slot]
+
+
+def offset_slot(slot, dx, dy):
+    """Dịch một ô (hộp hoặc đa giác) đi (dx, dy)."""
+    if is_polygon_slot(slot):
+        return [[int(x) + dx, int(y) + dy] for x, y in slot]
+    x1, y1, x2, y2 = slot
+    return [int(x1) + dx, int(y1) + dy, int(x2) + dx, int(y2) + dy]
+
+
+def scale_slot(slot, sx, sy):
+    """
+    Co giãn một ô theo hệ số (sx, sy). Hình chữ nhật xoay được đổi sang đa giác vì
+    phép co giãn không đều trục không giữ được dạng hình chữ nhật.
+    """
+    if is_polygon_slot(slot) or is_rotated_rect_slot(slot):
+        return (slot_polygon(slot) * np.array([sx, sy], dtype=np.float32)).tolist()
+    x1, y1, x2, y2 = slot
+    return [x1 * sx, y1 * sy, x2 * sx, y2 * sy]
+
+
+def slot_rectangles(slot, frame_shape):
+    """
+    Phân rã vùng của một ô thành các hình chữ nhật [r0, r1, c0, c1) không chồng lấn,
+    đã cắt theo kích thước khung hình.
+    
+    Hộp thẳng trục cho đúng một hình chữ nhật (cùng quy ước cắt `frame[y1:y2, x1:x2]`);
+    đa giác được raster hóa một lần rồi nén thành các đoạn chạy theo hàng, các hàng
+    liên tiếp có cùng đoạn chạy được gộp lại.
+    
+    Returns:
+        Mảng int32 (K, 4) các hình chữ nhật (có thể rỗng)
+    """
+    frame_h, frame_w = frame_shape[:2]
+    if not (is_polygon_slot(slot) or is_rotated_rect_slot(slot)):
+        x1, y1, x2, y2 = (int(v) for v in slot)
+        x1, x2 = np.clip([x1, x2], 0, frame_w)
+        y1, y2 = np.clip([y1, y2], 0, frame_h)
+        if x2 <= x1 or y2 <= y1:
+            return np.zeros((0, 4), dtype=np.int32)
+        return np.array([[y1, y2, x1, x2]], dtype=np.int32)
+    
+    points = np.rint(slot_polygon(slot)).astype(np.int32)
+    bx1, by1 = np.maximum(points.min(axis=0), 0)
+    bx2, by2 = np.minimum(points.max(axis=0) + 1, [frame_w, frame_h])
+    if bx2 <= bx1 or by2 <= by1:
+        return np.zeros((0, 4), dtype=np.int32)
+    
+    local = np.zeros((by2 - by1, bx2 - bx1), dtype=np.uint8)
+    cv2.fillPoly(local, [points - [bx1, by1]], 1)
+    
+    # Đoạn chạy theo hàng: vị trí 0 -> 1 là điểm bắt đầu, 1 -> 0 là điểm kết thúc
+    padded = np.pad(local, ((0, 0), (1, 1)))
+    transitions = np.diff(padded.astype(np.int8), axis=1)
+    start_rows, starts = np.nonzero(transitions == 1)
+    _, ends = np.nonzero(transitions == -1)
+    if len(starts) == 0:
+        return np.zeros((0, 4), dtype=np.int32)
+    
+    # Gộp các hàng liên tiếp có cùng đoạn chạy thành một hình chữ nhật
+    rects = []
+    for row, start, end in zip(start_rows, starts, ends):
+        if rects and rects[-1][1] == row and rects[-1][2] == start and rects[-1][3] == end:
+            rects[-1][1] = row + 1
+        else:
+            rects.append([row, row + 1, start, end])
+    rects = np.array(rects, dtype=np.int32)
+    rects[:, :2] += by1
+    rects[:, 2:] += bx1
+    return rects
@@ -0,0 +1,317 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+from src.slot_geometry import is_polygon_slot, is_rotated_rect_slot, scale_slot, slot_polygon, slot_rectangles
+
+# Phiên bản định dạng file nhị phân đi kèm (sidecar); tăng khi đổi cấu trúc
+SIDECAR_VERSION = 2
+
+
+class SlotLayout:
+    """
+    Bố cục các ô đỗ xe đã được biên dịch một lần khi tải: kiểm tra hợp lệ, cắt theo
+    kích thước khung hình, loại ô trùng lặp / diện tích bằng 0 và sắp xếp theo hàng
+    (y rồi x) để các ô gần nhau cũng nằm gần nhau trong bộ nhớ.
+
+    Hộp bao của mọi ô được lưu trong một mảng int32 liên tục `boxes` (N, 4); ô đa giác
+    giữ thêm các đỉnh trong `polygons` (None với ô hộp thẳng trục).
+
+    File JSON lưu kèm độ phân giải tham chiếu mà tọa độ được đo trên đó
+    ({"reference_size": [rộng, cao], "slots": [...]}), nên bố cục tự co giãn theo
+    kích thước khung hình thực tế. Định dạng cũ (chỉ có danh sách ô) vẫn được đọc và
+    được coi là đo trên chính khung hình đang dùng.
+    """
+
+    def __init__(self, slots, frame_size=None, reference_size=None):
+        """
+        Biên dịch bố cục từ danh sách ô thô (định dạng JSON).
+
+        Args:
+            slots: Danh sách hộp [x1, y1, x2, y2], đa giác [[x, y], ...] hoặc hình chữ
+                nhật xoay {'center', 'size', 'angle'}
+            frame_size: (rộng, cao) của khung hình để cắt tọa độ, hoặc None
+            reference_size: (rộng, cao) của khung hình mà tọa độ `slots` được đo trên đó;
+                nếu khác `frame_size` thì tọa độ được co giãn tương ứng
+        """
+        self.frame_size = tuple(frame_size) if frame_size is not None else None
+        if reference_size is not None and self.frame_size is not None \
+                and tuple(reference_size) != self.frame_size:
+            sx = self.frame_size[0] / reference_size[0]
+            sy = self.frame_size[1] / reference_size[1]
+            slots = [scale_slot(slot, sx, sy) for slot in slots]
+        elif self.frame_size is None and reference_size is not None:
+            self.frame_size = tuple(reference_size)
+
+        compiled = {}
+        dropped = 0
+        for slot in slots:
+            entry = self._compile_slot(slot)
+            if entry is None:
+                dropped += 1
+                continue
+            key = (tuple(entry[0]), None if entry[1] is None else entry[1].tobytes())
+            if key in compiled:
+                dropped += 1
+                continue
+            compiled[key] = entry
+        if dropped:
+            print(f"[WARNING] Đã bỏ qua {dropped} ô không hợp lệ, trùng lặp hoặc có diện tích bằng 0.")
+
+        entries = sorted(compiled.values(), key=lambda entry: (entry[0][1], entry[0][0]))
+        self.boxes = np.ascontiguousarray(
+            np.array([box for box, _ in entries], dtype=np.int32).reshape(-1, 4))
+        self.polygons = [polygon for _, polygon in entries]
+        self._finalize()
+
+    def _compile_slot(self, slot):
+        """Chuẩn hóa một ô; trả về (hộp bao, đa giác hoặc None) hoặc None nếu không hợp lệ."""
+        try:
+            if is_polygon_slot(slot) or is_rotated_rect_slot(slot):
+                polygon = np.rint(slot_polygon(slot)).astype(np.int32).reshape(-1, 2)
+                if len(polygon) < 3:
+                    return None
+                if self.frame_size is not None:
+                    polygon[:, 0] = np.clip(polygon[:, 0], 0, self.frame_size[0] - 1)
+                    polygon[:, 1] = np.clip(polygon[:, 1], 0, self.frame_size[1] - 1)
+                x1, y1 = polygon.min(axis=0)
+                x2, y2 = polygon.max(axis=0)
+                # Đa giác suy biến (mọi đỉnh thẳng hàng) không có diện tích
+                x, y = polygon[:, 0].astype(np.int64), polygon[:, 1].astype(np.int64)
+                if np.dot(x, np.roll(y, -1)) == np.dot(y, np.roll(x, -1)):
+                    return None
+                return [int(x1), int(y1), int(x2), int(y2)], polygon
+
+            x1, y1, x2, y2 = (int(round(float(v))) for v in slot)
+        except (TypeError, ValueError, KeyError):
+            return None
+
+        x1, x2 = min(x1, x2), max(x1, x2)
+        y1, y2 = min(y1, y2), max(y1, y2)
+        if self.frame_size is not None:
+            x1, x2 = np.clip([x1, x2], 0, self.frame_size[0])
+            y1, y2 = np.clip([y1, y2], 0, self.frame_size[1])
+        if x2 <= x1 or y2 <= y1:
+            return None
+        return [int(x1), int(y1), int(x2), int(y2)], None
+
+    def _finalize(self):
+        """Tính các dữ liệu dẫn xuất dùng lại ở mỗi khung hình."""
+        self.boxes.setflags(write=False)
+        self.slots = [
+            box if polygon is None else polygon.tolist()
+            for box, polygon in zip(self.boxes.tolist(), self.polygons)
+        ]
+        self._integral_cache = {}
+
+        digest = hashlib.sha1(self.boxes.tobytes())
+        for polygon in self.polygons:
+            digest.update(b'-' if polygon is None else polygon.tobytes())
+        self.digest = digest.hexdigest()
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __iter__(self):
+        return iter(self.slots)
+
+    def __getitem__(self, index):
+        return self.slots[index]
+
+    def geometry_keys(self):
+        """Khóa hình học của từng ô, dùng để nhận ra ô không đổi giữa hai bố cục."""
+        return [
+            tuple(box) if polygon is None else polygon.tobytes()
+            for box, polygon in zip(self.boxes.tolist(), self.polygons)
+        ]
+
+    def integral_indices(self, frame_shape):
+        """
+        Chỉ số phẳng trên ảnh tích phân (H+1, W+1) để đếm điểm ảnh của từng ô.
+
+        Mỗi ô được phân rã thành các hình chữ nhật; hộp thẳng trục chỉ có đúng một.
+        Kết quả được lưu đệm theo kích thước khung hình.
+
+        Returns:
+            Tuple (chỉ số ô hợp lệ, chỉ số 4 góc (4, K), offset hình chữ nhật đầu tiên
+            của từng ô, diện tích từng ô)
+        """
+        frame_shape = tuple(frame_shape[:2])
+        cached = self._integral_cache.get(frame_shape)
+        if cached is not None:
+            return cached
+
+        rects_per_slot = [
+            slot_rectangles(slot, frame_shape) for slot in self.slots
+        ]
+        counts = np.array([len(r) for r in rects_per_slot], dtype=np.int64)
+        valid = np.flatnonzero(counts > 0)
+        if len(valid):
+            rects = np.concatenate([rects_per_slot[i] for i in valid]).astype(np.int64)
+        else:
+            rects = np.zeros((0, 4), dtype=np.int64)
+
+        r0, r1, c0, c1 = rects.T
+        stride = frame_shape[1] + 1
+        corner_index = np.stack([r1 * stride + c1, r0 * stride + c1,
+                                 r1 * stride + c0, r0 * stride + c0])
+        rect_offsets = np.concatenate([[0], np.cumsum(counts[valid])[:-1]]).astype(np.int64)
+        areas = (r1 - r0) * (c1 - c0)
+        areas = np.add.reduceat(areas, rect_offsets) if len(areas) else areas
+
+        cached = (valid, corner_index, rect_offsets, areas)
+        self._integral_cache[frame_shape] = cached
+        return cached
+
+    def scaled_to(self, frame_size):
+        """
+        Bố cục mới với tọa độ co giãn về kích thước khung hình `frame_size` (rộng, cao).
+
+        Thứ tự ô được giữ nguyên 1:1 (không sắp xếp lại, không loại trùng) để chỉ số
+        ô khớp với mảng trạng thái của bố cục gốc; ô suy biến sau khi co giãn vẫn được
+        giữ lại và bị `integral_indices` coi là không hợp lệ.
+        """
+        frame_size = tuple(frame_size)
+        if self.frame_size is None or self.frame_size == frame_size:
+            return self
+        sx = frame_size[0] / self.frame_size[0]
+        sy = frame_size[1] / self.frame_size[1]
+
+        boxes = np.rint(self.boxes * np.array([sx, sy, sx, sy])).astype(np.int32)
+        boxes[:, 0::2] = np.clip(boxes[:, 0::2], 0, frame_size[0])
+        boxes[:, 1::2] = np.clip(boxes[:, 1::2], 0, frame_size[1])
+        polygons = []
+        for i, polygon in enumerate(self.polygons):
+            if polygon is not None:
+                polygon = np.rint(polygon * np.array([sx, sy])).astype(np.int32)
+                polygon[:, 0] = np.clip(polygon[:, 0], 0, frame_size[0] - 1)
+                polygon[:, 1] = np.clip(polygon[:, 1], 0, frame_size[1] - 1)
+                boxes[i] = np.concatenate([polygon.min(axis=0), polygon.max(axis=0)])
+            polygons.append(polygon)
+
+        layout = SlotLayout.__new__(SlotLayout)
+        layout.frame_size = frame_size
+        layout.boxes = np.ascontiguousarray(boxes)
+        layout.polygons = polygons
+        layout._finalize()
+        return layout
+
+    def to_json(self):
+        """
+        Bố cục dạng JSON (hộp hoặc đa giác theo thứ tự đã biên dịch) kèm độ phân giải
+        tham chiếu nếu biết.
+        """
+        if self.frame_size is None:
+            return self.slots
+        return {'reference_size': list(self.frame_size), 'slots': self.slots}
+
+    @staticmethod
+    def parse_json(data):
+        """
+        Tách dữ liệu JSON của file bố cục.
+
+        Returns:
+            Tuple (danh sách ô, độ phân giải tham chiếu hoặc None với định dạng cũ)
+        """
+        if isinstance(data, dict):
+            reference_size = data.get('reference_size')
+            return data.get('slots', []), tuple(reference_size) if reference_size else None
+        return data, None
+
+    @staticmethod
+    def sidecar_path(path):
+        """Đường dẫn file nhị phân đi kèm của một file bố cục JSON."""
+        return os.path.splitext(path)[0] + '.layout.npz'
+
+    @classmethod
+    def load(cls, path, frame_size=None):
+        """
+        Tải bố cục từ file JSON, ưu tiên file nhị phân đi kèm nếu còn mới (cùng thời
+        gian sửa đổi và kích thước file JSON, cùng kích thước khung hình kết quả) để bỏ qua
+        việc phân tích JSON và biên dịch lại với các bố cục lớn.
+
+        Returns:
+            SlotLayout, hoặc None nếu file không tồn tại hoặc rỗng
+        """
+        if not os.path.exists(path):
+            return None
+        stat = os.stat(path)
+        source_key = np.array([stat.st_mtime_ns, stat.st_size], dtype=np.int64)
+        sidecar = cls.sidecar_path(path)
+
+        layout = cls._load_sidecar(sidecar, source_key, frame_size)
+        if layout is not None:
+            return layout
+
+        with open(path, 'r') as f:
+            slots, reference_size = cls.parse_json(json.load(f))
+        if not slots:
+            return None
+        layout = cls(slots, frame_size, reference_size)
+        try:
+            layout._save_sidecar(sidecar, source_key, reference_size)
+        except OSError as e:
+            print(f"[WARNING] Không thể ghi file bố cục nhị phân '{sidecar}': {e}")
+        return layout
+
+    def save(self, path):
+        """Lưu bố cục ra file JSON kèm file nhị phân đi kèm."""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.to_json(), f)
+        stat = os.stat(path)
+        self._save_sidecar(self.sidecar_path(path),
+                           np.array([stat.st_mtime_ns, stat.st_size], dtype=np.int64), self.frame_size)
+
+    def _save_sidecar(self, sidecar, source_key, reference_size):
+        """
+        Ghi file nhị phân đi kèm. `reference_size` là độ phân giải tham chiếu trong file
+        JSON, để biết bố cục đã biên dịch ứng với lời gọi `load` nào.
+        """
+        vertex_counts = np.array([0 if p is None else len(p) for p in self.polygons], dtype=np.int32)
+        polygons = [p for p in self.polygons if p is not None]
+        vertices = np.concatenate(polygons) if polygons else np.zeros((0, 2), dtype=np.int32)
+        frame_size = np.array(self.frame_size if self.frame_size is not None else (-1, -1), dtype=np.int64)
+        reference_size = np.array(reference_size if reference_size is not None else (-1, -1), dtype=np.int64)
+
+        # Ghi ra file tạm rồi đổi tên để không bao giờ để lại file dở dang
+        tmp_path = sidecar + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, version=np.int32(SIDECAR_VERSION), source_key=source_key,
+                     frame_size=frame_size, reference_size=reference_size, boxes=self.boxes,
+                     vertex_counts=vertex_counts, vertices=vertices.astype(np.int32))
+        os.replace(tmp_path, sidecar)
+
+    @classmethod
+    def _load_sidecar(cls, sidecar, source_key, frame_size):
+        if not os.path.exists(sidecar):
+            return None
+        try:
+            with np.load(sidecar) as data:
+                if (int(data['version']) != SIDECAR_VERSION
+                        or not np.array_equal(data['source_key'], source_key)):
+                    return None
+                # Kích thước khung hình mà bố cục sẽ có nếu biên dịch lại từ JSON:
+                # kích thước được yêu cầu, hoặc độ phân giải tham chiếu của file
+                stored_size = data['frame_size']
+                expected_size = data['reference_size'] if frame_size is None \
+                    else np.array(frame_size, dtype=np.int64)
+                if not np.array_equal(stored_size, expected_size):
+                    return None
+                boxes = data['boxes']
+                vertex_counts = data['vertex_counts']
+                vertices = data['vertices']
+        except (OSError, KeyError, ValueError):
+            return None
+
+        layout = cls.__new__(cls)
+        layout.frame_size = tuple(int(v) for v in stored_size) if stored_size[0] >= 0 else None
+        layout.boxes = np.ascontiguousarray(boxes, dtype=np.int32)
+        splits = np.cumsum(vertex_counts)[:-1]
+        layout.polygons = [
+            None if count == 0 else polygon
+            for count, polygon in zip(vertex_counts, np.split(vertices, splits))
+        ]
+        layout._finalize()
+        return layout
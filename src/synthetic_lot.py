@@ -0,0 +1,173 @@
+import math
+import cv2
+import numpy as np
+
+# Màu thân xe (BGR) được chọn ngẫu nhiên khi xe vào ô
+CAR_COLORS = np.array([
+    (30, 30, 30), (235, 235, 235), (190, 190, 195), (120, 120, 125), (40, 40, 160),
+    (150, 70, 30), (40, 110, 40), (30, 160, 200), (90, 50, 110), (60, 90, 140),
+], dtype=np.uint8)
+
+class SyntheticLot:
+    """
+    Bãi đỗ xe tổng hợp, tất định theo `seed`, dùng để đo khả năng mở rộng của
+    SlotDetector và ParkingManager với số ô tùy ý (10 - 10.000) mà không cần dữ liệu ngoài.
+
+    Các ô được xếp thành từng cặp hàng quay lưng vào nhau, ngăn cách bởi lối đi, với vạch
+    sơn trắng giữa các ô. Mỗi khung hình xe có thể vào/rời ô (chuỗi Markov với tỉ lệ lấp
+    đầy dừng `occupancy`), ánh sáng trôi chậm và có nhiễu cảm biến. Kèm theo là bố cục
+    chuẩn (hộp [x1, y1, x2, y2] theo tâm vạch sơn) và trạng thái bị chiếm thực sự.
+    """
+
+    def __init__(self, num_slots, frame_size=(1920, 1080), seed=0, occupancy=0.5, churn=0.01,
+                 lighting_drift=0.15, lighting_period=300, noise_sigma=4.0, front_lines=True):
+        """
+        Args:
+            num_slots: Số ô đỗ xe
+            frame_size: (rộng, cao) của khung hình
+            seed: Hạt giống ngẫu nhiên; cùng tham số và seed cho cùng chuỗi khung hình
+            occupancy: Tỉ lệ ô bị chiếm trung bình
+            churn: Xác suất mỗi ô đổi trạng thái trong một khung hình (trung bình)
+            lighting_drift: Biên độ dao động độ sáng (tỉ lệ)
+            lighting_period: Chu kỳ dao động độ sáng (số khung hình)
+            noise_sigma: Độ lệch chuẩn nhiễu cảm biến (mức xám)
+            front_lines: Vẽ cả vạch ngang phía lối đi của mỗi hàng
+        """
+        self.num_slots = int(num_slots)
+        self.frame_size = tuple(frame_size)
+        self.seed = seed
+        self.occupancy = occupancy
+        self.lighting_drift = lighting_drift
+        self.lighting_period = lighting_period
+        self.noise_sigma = noise_sigma
+        self.front_lines = front_lines
+        self._rng = np.random.default_rng(seed)
+        # Xác suất chuyển trạng thái để tỉ lệ lấp đầy dừng bằng `occupancy`
+        self._p_arrive = min(1.0, churn * occupancy * 2)
+        self._p_leave = min(1.0, churn * (1 - occupancy) * 2)
+
+        self.slots, self._lines = self._make_layout()
+        self._background = self._make_background()
+        self._scene = self._background.copy()
+        self._noise_bank = self._make_noise_bank()
+
+        self.occupied = np.zeros(self.num_slots, dtype=bool)
+        self.frame_index = 0
+        self._set_occupied(self._rng.random(self.num_slots) < occupancy)
+
+    def layout_json(self):
+        """Bố cục chuẩn theo định dạng file bố cục của dự án (xem SlotLayout.to_json)."""
+        return {'reference_size': list(self.frame_size), 'slots': self.slots}
+
+    def frames(self, num_frames):
+        """Sinh `num_frames` khung hình: mỗi phần tử là (khung hình BGR, mảng bool ô bị chiếm)."""
+        for _ in range(num_frames):
+            frame = self.render_frame()
+            yield frame, self.occupied.copy()
+
+    def render_frame(self):
+        """Khung hình tiếp theo (đã cập nhật xe vào/ra, ánh sáng, nhiễu)."""
+        if self.frame_index > 0:
+            draw = self._rng.random(self.num_slots)
+            flip = np.where(self.occupied, draw < self._p_leave, draw < self._p_arrive)
+            self._set_occupied(self.occupied ^ flip)
+
+        # Độ sáng trôi theo hình sin cộng thêm một chút dao động ngẫu nhiên
+        phase = 2 * math.pi * self.frame_index / self.lighting_period
+        gain = 1.0 + self.lighting_drift * math.sin(phase) + self._rng.normal(0, self.lighting_drift * 0.05)
+        frame = cv2.convertScaleAbs(self._scene, alpha=gain)
+        if self.noise_sigma > 0:
+            positive, negative = self._noise_bank[self._rng.integers(len(self._noise_bank))]
+            cv2.add(frame, positive, frame)
+            cv2.subtract(frame, negative, frame)
+        self.frame_index += 1
+        return frame
+
+    def _set_occupied(self, occupied):
+        """Vẽ xe vào các ô vừa có xe và xóa xe khỏi các ô vừa trống trên ảnh cảnh."""
+        for i in np.flatnonzero(occupied != self.occupied):
+            x1, y1, x2, y2 = self.slots[i]
+            if occupied[i]:
+                self._draw_car(x1, y1, x2, y2)
+            else:
+                self._scene[y1:y2 + 1, x1:x2 + 1] = self._background[y1:y2 + 1, x1:x2 + 1]
+        self.occupied = occupied
+
+    def _draw_car(self, x1, y1, x2, y2):
+        w, h = x2 - x1, y2 - y1
+        mx, my = max(1, int(w * 0.15)), max(1, int(h * 0.08))
+        body = tuple(int(c) for c in CAR_COLORS[self._rng.integers(len(CAR_COLORS))])
+        cv2.rectangle(self._scene, (x1 + mx, y1 + my), (x2 - mx, y2 - my), body, -1)
+        # Kính chắn gió và kính sau tối màu, nóc xe ở giữa
+        glass = (35, 30, 25)
+        inner_x1, inner_x2 = x1 + mx + max(1, w // 10), x2 - mx - max(1, w // 10)
+        cv2.rectangle(self._scene, (inner_x1, y1 + my + h // 6), (inner_x2, y1 + my + h // 3), glass, -1)
+        cv2.rectangle(self._scene, (inner_x1, y2 - my - h // 4), (inner_x2, y2 - my - h // 8), glass, -1)
+
+    def _make_layout(self):
+        """
+        Chọn kích thước ô lớn nhất để xếp đủ `num_slots` ô, rồi trả về danh sách ô và
+        các đoạn vạch sơn cần vẽ.
+        """
+        frame_w, frame_h = self.frame_size
+        for slot_w in range(max(frame_w, frame_h) // 4, 3, -1):
+            slot_h = 2 * slot_w
+            aisle = int(slot_h * 0.9)
+            margin = slot_w
+            cols = (frame_w - 2 * margin) // slot_w
+            pairs = (frame_h - 2 * margin + aisle) // (2 * slot_h + aisle)
+            single = (frame_h - 2 * margin + aisle) - pairs * (2 * slot_h + aisle) >= slot_h + aisle
+            rows = 2 * pairs + int(single)
+            if cols > 0 and cols * rows >= self.num_slots:
+                break
+        else:
+            raise ValueError(f"Không thể xếp {self.num_slots} ô vào khung hình {frame_w}x{frame_h}")
+
+        # Căn giữa khối ô trong khung hình
+        used_rows = math.ceil(self.num_slots / cols)
+        block_h = (used_rows // 2) * (2 * slot_h + aisle) + (used_rows % 2) * (slot_h + aisle) - aisle
+        x0 = (frame_w - cols * slot_w) // 2
+        y0 = (frame_h - block_h) // 2
+
+        slots, lines = [], []
+        for row in range(used_rows):
+            top = y0 + (row // 2) * (2 * slot_h + aisle) + (row % 2) * slot_h
+            n = min(cols, self.num_slots - row * cols)
+            for col in range(n):
+                slots.append([x0 + col * slot_w, top, x0 + (col + 1) * slot_w, top + slot_h])
+            row_x2 = x0 + n * slot_w
+            # Vạch dọc giữa các ô, vạch ngang phía sau (chung cho cặp hàng) và phía lối đi
+            lines.extend(((x, top), (x, top + slot_h)) for x in range(x0, row_x2 + 1, slot_w))
+            back, front = (top + slot_h, top) if row % 2 == 0 else (top, top + slot_h)
+            lines.append(((x0, back), (row_x2, back)))
+            if self.front_lines:
+                lines.append(((x0, front), (row_x2, front)))
+        self.slot_size = (slot_w, slot_h)
+        self.line_thickness = max(1, round(slot_w / 12))
+        return slots, lines
+
+    def _make_background(self):
+        """Mặt nhựa đường có vân nhẹ và các vạch sơn."""
+        frame_w, frame_h = self.frame_size
+        texture = self._rng.normal(0, 1, (frame_h // 8 + 1, frame_w // 8 + 1)).astype(np.float32)
+        texture = cv2.resize(cv2.GaussianBlur(texture, (0, 0), 2), (frame_w, frame_h),
+                             interpolation=cv2.INTER_LINEAR)
+        gray = np.clip(95 + 10 * texture, 0, 255).astype(np.uint8)
+        background = cv2.merge([gray, gray, np.clip(gray.astype(np.int16) + 3, 0, 255).astype(np.uint8)])
+        for p1, p2 in self._lines:
+            cv2.line(background, p1, p2, (230, 230, 230), self.line_thickness)
+        return background
+
+    def _make_noise_bank(self, size=3):
+        """
+        Vài khung nhiễu dựng sẵn, chọn ngẫu nhiên mỗi khung hình để tránh sinh nhiễu mới.
+        Mỗi khung được tách thành phần dương/âm (uint8) để cộng/trừ bão hòa bằng OpenCV.
+        """
+        if self.noise_sigma <= 0:
+            return []
+        frame_w, frame_h = self.frame_size
+        bank = []
+        for _ in range(size):
+            noise = np.clip(np.rint(self._rng.normal(0, self.noise_sigma, (frame_h, frame_w, 3))), -255, 255)
+            bank.append((np.maximum(noise, 0).astype(np.uint8), np.maximum(-noise, 0).astype(np.uint8)))
+        return bank
@@ -0,0 +1,69 @@
+import collections
+import json
+import os
+import threading
+import time
+
+class Tracer:
+    """
+    Ghi các span của từng khung hình (tên giai đoạn, thời điểm bắt đầu/kết thúc, luồng)
+    vào bộ đệm có giới hạn và xuất ra định dạng Chrome trace-event JSON, mở được bằng
+    chrome://tracing hoặc https://ui.perfetto.dev để thấy các giai đoạn chồng lấn hay
+    bị nghẽn giữa luồng phân tích, luồng hiển thị và các sink.
+    """
+
+    def __init__(self, config):
+        params = config.get('tracing', {}) or {}
+        self.path_pattern = params.get('path', "data/traces/trace_%Y%m%d_%H%M%S.json")
+        self.window_sec = params.get('window_sec', 30)
+        # Sự kiện: (tên, bắt đầu, kết thúc, mã luồng, số thứ tự khung hình); cũ nhất bị bỏ khi đầy
+        self._events = collections.deque(maxlen=params.get('buffer_size', 100000))
+        self._thread_names = {}
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self.frame_index = 0
+
+    def add(self, name, start, end):
+        """Ghi một span; `start`, `end` lấy từ time.perf_counter()."""
+        thread = threading.current_thread()
+        with self._lock:
+            self._events.append((name, start, end, thread.ident, self.frame_index))
+            if thread.ident not in self._thread_names:
+                self._thread_names[thread.ident] = thread.name
+
+    def trace_events(self, window_sec=None):
+        """Danh sách trace event của `window_sec` giây gần nhất (None = toàn bộ bộ đệm)."""
+        with self._lock:
+            events = list(self._events)
+            thread_names = dict(self._thread_names)
+        if window_sec is not None and events:
+            cutoff = max(end for _, _, end, _, _ in events) - window_sec
+            events = [e for e in events if e[2] >= cutoff]
+
+        pid = os.getpid()
+        trace = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+                 for tid, name in thread_names.items()]
+        for name, start, end, tid, frame_index in events:
+            trace.append({
+                'name': name, 'cat': 'pipeline', 'ph': 'X', 'pid': pid, 'tid': tid,
+                'ts': round((start - self._origin) * 1e6, 1),
+                'dur': round((end - start) * 1e6, 1),
+                'args': {'frame': frame_index},
+            })
+        return trace
+
+    def export(self, path=None, window_sec=None):
+        """
+        Ghi trace ra file JSON (mặc định theo `path` trong cấu hình, cửa sổ `window_sec`).
+
+        Returns:
+            Đường dẫn file đã ghi
+        """
+        path = path or time.strftime(self.path_pattern)
+        window_sec = self.window_sec if window_sec is None else window_sec
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': self.trace_events(window_sec), 'displayTimeUnit': 'ms'}, f)
+        os.replace(tmp_path, path)
+        return path
@@ -1,52 +1,220 @@
 import cv2
 import time
+import numpy as np
+from src.instrumentation import NULL_INSTRUMENTATION
+from src.slot_geometry import is_polygon_slot, is_rotated_rect_slot, slot_polygon, scale_slot
+
+# Màu ô theo trạng thái (BGR): chỉ số 0 = trống (xanh), 1 = đầy (đỏ)
+SLOT_COLORS = np.array([(0, 255, 0), (0, 0, 255)], dtype=np.uint8)
+
+# Bảng thông tin phía trên khung hình (kích thước ở tỉ lệ 1.0, co giãn theo tỉ lệ hiển thị)
+PANEL_HEIGHT = 100
+PANEL_TRANSPARENCY = 0.6
 
 class Visualizer:
-    def __init__(self, occupancy_params):
+    def __init__(self, occupancy_params, instrumentation=None):
         self.alpha = occupancy_params.get('alpha', 0.5)
+        self.instrumentation = instrumentation or NULL_INSTRUMENTATION
         self.prev_frame_time = 0
         
-    def draw_slots(self, frame, slots, statuses):
-        painting_overlay = frame.copy()
+        # Bản đồ nhãn của các ô, dựng lại khi bố cục hoặc kích thước khung hình đổi
+        self._label_slots = None
+        self._label_key = None
+        # Lớp màu của vùng chứa các ô, chỉ tô lại khi trạng thái thay đổi
+        self._overlay = None
+        self._overlay_statuses = None
+        # Các lớp bảng thông tin đã dựng sẵn
+        self._panel_key = None
+        self._panel_static = None
+        self._panel_dynamic = None
+        self._panel_dynamic_key = None
         
-        for i, (xi, yi, xf, yf) in enumerate(slots):
-            is_free = statuses[i]
-            color = (0, 255, 0) if is_free else (0, 0, 255)  # Xanh nếu trống, đỏ nếu đầy
-            cv2.rectangle(painting_overlay, (xi, yi), (xf, yf), color, -1)
-        final_frame = cv2.addWeighted(painting_overlay, self.alpha, frame, 1 - self.alpha, 0)
+    def draw_slots(self, frame, slots, statuses, source_size=None):
+        """
+        Tô màu các ô theo trạng thái và trả về khung hình mới; `frame` không bị thay đổi.
         
-        # **** THAY ĐỔI QUAN TRỌNG: Chỉ trả về frame, không tính toán lại ****
+        Args:
+            source_size: (rộng, cao) của khung hình mà tọa độ `slots` tham chiếu tới. Khi
+                `frame` đã được thu nhỏ để hiển thị, tọa độ được co giãn theo kích thước
+                của `frame` (lưu đệm theo từng kích thước hiển thị)
+        """
+        final_frame = frame.copy()
+        self._blend_slots(final_frame, slots, statuses, source_size)
         return final_frame
     
-    def draw_ui_panel(self, frame, available_slots, total_slots, fps):
+    def _blend_slots(self, frame, slots, statuses, source_size=None):
+        """
+        Như `draw_slots` nhưng trộn alpha trực tiếp lên `frame` (ghi đè tại chỗ); chỉ dùng
+        cho khung hình mà bên gọi sở hữu riêng.
+        
+        Bản đồ nhãn (mỗi điểm ảnh -> chỉ số ô) được dựng một lần cho mỗi bố cục, lớp màu
+        chỉ được tô lại từ bản đồ này khi trạng thái đổi; mỗi khung hình chỉ còn một phép
+        addWeighted trên vùng bao các ô và chép lại đúng các điểm ảnh thuộc ô.
+        """
+        label_key = (frame.shape, source_size)
+        if self._label_slots is not slots or self._label_key != label_key:
+            self._build_label_map(frame.shape, slots, source_size)
+            self._label_key = label_key
+        if self._region is None:
+            return
+        
+        statuses = np.asarray(statuses, dtype=bool)
+        if self._overlay is None or not np.array_equal(self._overlay_statuses, statuses):
+            # Nhãn 0 là nền, nhãn i + 1 lấy màu theo trạng thái của ô i
+            label_colors = np.vstack([SLOT_COLORS[:1], SLOT_COLORS[np.logical_not(statuses).astype(np.intp)]])
+            self._overlay = label_colors[self._labels]
+            self._overlay_statuses = statuses.copy()
+        
+        roi = frame[self._region]
+        blended = cv2.addWeighted(self._overlay, self.alpha, roi, 1 - self.alpha, 0)
+        cv2.copyTo(blended, self._mask, roi)
+    
+    def _build_label_map(self, frame_shape, slots, source_size=None):
+        """Vẽ nhãn (i + 1) của từng ô trong vùng bao của mọi ô, theo đúng thứ tự vẽ cũ."""
+        frame_h, frame_w = frame_shape[:2]
+        scaled = source_size is not None and tuple(source_size) != (frame_w, frame_h)
+        shapes = []
+        for slot in slots:
+            if scaled:
+                slot = scale_slot(slot, frame_w / source_size[0], frame_h / source_size[1])
+            if is_polygon_slot(slot) or is_rotated_rect_slot(slot):
+                points = np.rint(slot_polygon(slot)).astype(np.int32)
+                shapes.append((points, points.min(axis=0), points.max(axis=0)))
+            else:
+                xi, yi, xf, yf = (int(round(v)) if scaled else int(v) for v in slot)
+                shapes.append((None, (min(xi, xf), min(yi, yf)), (max(xi, xf), max(yi, yf))))
+        
+        self._region = None
+        if shapes:
+            # Vùng bao của mọi ô (cv2.rectangle tô cả cạnh x2, y2 nên +1), cắt theo khung hình
+            x0 = max(min(lo[0] for _, lo, _ in shapes), 0)
+            y0 = max(min(lo[1] for _, lo, _ in shapes), 0)
+            x1 = min(max(hi[0] for _, _, hi in shapes) + 1, frame_w)
+            y1 = min(max(hi[1] for _, _, hi in shapes) + 1, frame_h)
+            if x1 > x0 and y1 > y0:
+                labels = np.zeros((y1 - y0, x1 - x0), dtype=np.int32)
+                for i, (points, lo, hi) in enumerate(shapes):
+                    if points is not None:
+                        cv2.fillPoly(labels, [points - [x0, y0]], i + 1)
+                    else:
+                        cv2.rectangle(labels, (lo[0] - x0, lo[1] - y0), (hi[0] - x0, hi[1] - y0), i + 1, -1)
+                self._region = (slice(y0, y1), slice(x0, x1))
+                self._labels = labels
+                self._mask = (labels > 0).astype(np.uint8)
+        
+        self._overlay = None
+        self._label_slots = slots
+    
+    def render(self, frame, slots, statuses, available_slots, total_slots, fps,
+               display_scale=1.0, render_at_display_scale=True):
+        """
+        Vẽ ô và bảng thông tin rồi trả về khung hình ở kích thước hiển thị; `frame` gốc
+        không bị thay đổi.
+        
+        Mặc định khung hình gốc được thu nhỏ trước rồi mới vẽ lên ảnh nhỏ (tọa độ ô được co
+        giãn và lưu đệm theo kích thước hiển thị), nên phép vẽ và trộn chỉ chạm tới khoảng
+        display_scale^2 số điểm ảnh. `render_at_display_scale=False` vẽ ở độ phân giải gốc
+        rồi mới thu nhỏ như trước.
+        """
+        with self.instrumentation.span('render'):
+            return self._render(frame, slots, statuses, available_slots, total_slots, fps,
+                                display_scale, render_at_display_scale)
+    
+    def _render(self, frame, slots, statuses, available_slots, total_slots, fps,
+                display_scale, render_at_display_scale):
+        width = int(frame.shape[1] * display_scale)
+        height = int(frame.shape[0] * display_scale)
+        
+        if render_at_display_scale:
+            display_frame = cv2.resize(frame, (width, height)) if display_scale != 1.0 else frame.copy()
+            with self.instrumentation.span('draw_slots'):
+                # display_frame là bản sao riêng nên vẽ tại chỗ, không cần sao chép thêm
+                self._blend_slots(display_frame, slots, statuses, (frame.shape[1], frame.shape[0]))
+            with self.instrumentation.span('draw_ui_panel'):
+                self.draw_ui_panel(display_frame, available_slots, total_slots, fps, display_scale)
+            return display_frame
+        
+        with self.instrumentation.span('draw_slots'):
+            final_frame = self.draw_slots(frame, slots, statuses)
+        with self.instrumentation.span('draw_ui_panel'):
+            self.draw_ui_panel(final_frame, available_slots, total_slots, fps)
+        return cv2.resize(final_frame, (width, height)) if display_scale != 1.0 else final_frame
+    
+    def draw_ui_panel(self, frame, available_slots, total_slots, fps, scale=1.0):
         """
         Vẽ bảng thông tin UI lên khung hình.
         
+        Lớp tĩnh (đường kẻ, tiêu đề) được dựng sẵn một lần cho mỗi chiều rộng khung hình,
+        lớp chữ động chỉ dựng lại khi FPS hoặc số ô thay đổi; mỗi khung hình chỉ làm tối
+        dải bảng thông tin tại chỗ rồi chép hai lớp lên.
+        
         Args:
             frame: Khung hình để vẽ lên
             available_slots: Số ô trống
             total_slots: Tổng số ô
             fps: Số khung hình mỗi giây
+            scale: Tỉ lệ của bảng so với kích thước gốc (ví dụ tỉ lệ hiển thị khi vẽ
+                trực tiếp lên khung hình đã thu nhỏ)
         """
-        panel_height = 100
-        panel_color = (0, 0, 0)
-        panel_transparency = 0.6
-
-        ui_panel_overlay = frame.copy()
-        cv2.rectangle(ui_panel_overlay, (0, 0), (frame.shape[1], panel_height), panel_color, -1)
-        cv2.addWeighted(ui_panel_overlay, panel_transparency, frame, 1 - panel_transparency, 0, frame)
-
-        cv2.line(frame, (0, panel_height), (frame.shape[1], panel_height), (0, 255, 0), 2)
-
-        cv2.putText(frame, "PARKING STATUS", (frame.shape[1] // 2 - 150, 45),
-                    cv2.FONT_HERSHEY_SIMPLEX, 1.2, (255, 255, 255), 3)
-
-        cv2.putText(frame, f"FPS: {int(fps)}", (20, 65), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-
+        panel_key = (frame.shape[1:], scale)
+        if self._panel_key != panel_key:
+            self._build_panel_static(frame, scale)
+            self._panel_key = panel_key
+        dynamic_key = (int(fps), available_slots, total_slots)
+        if self._panel_dynamic_key != dynamic_key:
+            self._build_panel_dynamic(frame, *dynamic_key)
+            self._panel_dynamic_key = dynamic_key
+        
+        # Làm tối dải bảng thông tin (tương đương trộn với một lớp màu đen)
+        strip = frame[:len(self._panel_black)]
+        cv2.addWeighted(self._panel_black[:len(strip)], PANEL_TRANSPARENCY, strip,
+                        1 - PANEL_TRANSPARENCY, 0, strip)
+        
+        # Chép lớp tĩnh rồi lớp động theo đúng thứ tự vẽ cũ
+        for layer, mask in (self._panel_static, self._panel_dynamic):
+            rows = min(len(layer), frame.shape[0])
+            cv2.copyTo(layer[:rows], mask[:rows], frame[:rows])
+    
+    def _panel_canvases(self, frame):
+        """Lớp màu và mặt nạ rỗng cho bảng thông tin ở tỉ lệ hiện tại."""
+        # Lớp chữ/đường kẻ cao hơn dải nền vì đường kẻ nằm ngay tại cạnh dưới của dải
+        height = self._panel_height + self._panel_size(2) + 1
+        layer = np.zeros((height,) + frame.shape[1:], dtype=frame.dtype)
+        mask = np.zeros((height, frame.shape[1]), dtype=np.uint8)
+        return layer, mask
+    
+    def _panel_size(self, value):
+        """Kích thước (vị trí, độ dày nét) của bảng thông tin ở tỉ lệ hiện tại."""
+        return max(1, int(round(value * self._panel_scale)))
+    
+    def _build_panel_static(self, frame, scale):
+        """Dựng lớp nền đen, đường kẻ và tiêu đề cho chiều rộng khung hình hiện tại."""
+        frame_w = frame.shape[1]
+        self._panel_scale = scale
+        self._panel_height = self._panel_size(PANEL_HEIGHT)
+        self._panel_black = np.zeros((self._panel_height + 1,) + frame.shape[1:], dtype=frame.dtype)
+        layer, mask = self._panel_canvases(frame)
+        size = self._panel_size
+        for canvas, line_color, text_color in ((layer, (0, 255, 0), (255, 255, 255)), (mask, 255, 255)):
+            cv2.line(canvas, (0, self._panel_height), (frame_w, self._panel_height), line_color, size(2))
+            cv2.putText(canvas, "PARKING STATUS", (frame_w // 2 - size(150), size(45)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1.2 * scale, text_color, size(3))
+        self._panel_static = (layer, mask)
+        self._panel_dynamic_key = None
+    
+    def _build_panel_dynamic(self, frame, fps, available_slots, total_slots):
+        """Dựng lớp chữ FPS và số ô trống."""
+        frame_w = frame.shape[1]
+        layer, mask = self._panel_canvases(frame)
+        size, scale = self._panel_size, self._panel_scale
         status_text = f"AVAILABLE: {available_slots}/{total_slots}"
-        (text_width, _), _ = cv2.getTextSize(status_text, cv2.FONT_HERSHEY_SIMPLEX, 1, 2)
-        cv2.putText(frame, status_text, (frame.shape[1] - text_width - 20, 65),
-                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 220, 220), 2)
+        (text_width, _), _ = cv2.getTextSize(status_text, cv2.FONT_HERSHEY_SIMPLEX, scale, size(2))
+        for canvas, fps_color, status_color in ((layer, (0, 255, 0), (0, 220, 220)), (mask, 255, 255)):
+            cv2.putText(canvas, f"FPS: {fps}", (size(20), size(65)), cv2.FONT_HERSHEY_SIMPLEX,
+                        scale, fps_color, size(2))
+            cv2.putText(canvas, status_text, (frame_w - text_width - size(20), size(65)),
+                        cv2.FONT_HERSHEY_SIMPLEX, scale, status_color, size(2))
+        self._panel_dynamic = (layer, mask)
     
     def calculate_fps(self):
         """
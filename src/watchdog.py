@@ -0,0 +1,121 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+import tracemalloc
+
+class ProfilingWatchdog:
+    """
+    Theo dõi p95 thời gian xử lý mỗi khung hình; khi vượt ngân sách `budget_ms` thì tự
+    động bật cProfile hoặc tracemalloc cho `capture_frames` khung hình tiếp theo rồi ghi
+    kết quả ra đĩa kèm cấu hình và số ô, để bắt được những lần chậm thất thường trên máy
+    thật mà không cần gắn profiler bằng tay.
+
+    Cần số liệu của Instrumentation nên phần thống kê được bật khi watchdog được tạo.
+    cProfile chỉ đo luồng gọi `on_frame_end` (luồng phân tích).
+    """
+
+    def __init__(self, config, instrumentation):
+        params = config.get('profiling_watchdog', {}) or {}
+        self.config = config
+        self.instrumentation = instrumentation
+        self.instrumentation.enabled = True
+        self.stage = params.get('stage', 'frame')
+        self.budget_ms = params.get('budget_ms', 50)
+        self.mode = params.get('mode', 'cprofile')
+        if self.mode not in ('cprofile', 'tracemalloc'):
+            raise ValueError(f"profiling_watchdog.mode không hợp lệ: '{self.mode}' (chỉ hỗ trợ 'cprofile', 'tracemalloc')")
+        self.capture_frames = params.get('capture_frames', 100)
+        self.min_samples = params.get('min_samples', 100)
+        self.check_every = params.get('check_every_frames', 30)
+        self.cooldown_sec = params.get('cooldown_sec', 600)
+        self.max_captures = params.get('max_captures', 5)
+        self.output_dir = params.get('output_dir', "data/profiles")
+
+        self.captures = []
+        self._frames = 0
+        self._cooldown_until = 0.0
+        # Phiên đang ghi: (profiler hoặc None, số khung hình còn lại, thông tin lúc kích hoạt)
+        self._active = None
+
+    @property
+    def capturing(self):
+        return self._active is not None
+
+    def on_frame_end(self, **context):
+        """
+        Gọi sau mỗi khung hình trên luồng phân tích. `context` (ví dụ slots, frame_size)
+        được ghi kèm vào file kết quả.
+        """
+        if self._active is not None:
+            profiler, remaining, trigger = self._active
+            remaining -= 1
+            if remaining > 0:
+                self._active = (profiler, remaining, trigger)
+            else:
+                self._finish(profiler, trigger, context)
+            return
+
+        self._frames += 1
+        if self._frames % self.check_every or len(self.captures) >= self.max_captures:
+            return
+        if time.monotonic() < self._cooldown_until:
+            return
+        if len(self.instrumentation.samples(self.stage)) < self.min_samples:
+            return
+        p50, p95, p99 = self.instrumentation.percentiles(self.stage)
+        if p95 > self.budget_ms:
+            self._start({'stage': self.stage, 'budget_ms': self.budget_ms,
+                         'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99})
+
+    def _start(self, trigger):
+        print(f"[WARNING] p95 '{trigger['stage']}' = {trigger['p95_ms']:.1f} ms vượt ngân sách "
+              f"{self.budget_ms} ms, bắt đầu ghi {self.mode} cho {self.capture_frames} khung hình.")
+        trigger['started_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        if self.mode == 'cprofile':
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            profiler = None
+            tracemalloc.start(10)
+        self._active = (profiler, self.capture_frames, trigger)
+
+    def _finish(self, profiler, trigger, context):
+        self._active = None
+        self._cooldown_until = time.monotonic() + self.cooldown_sec
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, f"profile_{time.strftime('%Y%m%d_%H%M%S')}_{self.mode}")
+
+        summary = io.StringIO()
+        if profiler is not None:
+            profiler.disable()
+            data_path = base + '.prof'
+            profiler.dump_stats(data_path)
+            pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(40)
+        else:
+            snapshot = tracemalloc.take_snapshot()
+            traced, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            data_path = base + '.tracemalloc'
+            snapshot.dump(data_path)
+            summary.write(f"traced {traced / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB\n")
+            for stat in snapshot.statistics('lineno')[:40]:
+                summary.write(f"{stat}\n")
+        with open(base + '.txt', 'w', encoding='utf-8') as f:
+            f.write(summary.getvalue())
+
+        metadata = {
+            'mode': self.mode,
+            'frames': self.capture_frames,
+            'trigger': trigger,
+            'context': context,
+            'stats': self.instrumentation.summary(),
+            'config': self.config,
+            'data': os.path.basename(data_path),
+        }
+        with open(base + '.json', 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, indent=2, ensure_ascii=False, default=str)
+        self.captures.append(base)
+        print(f"[*] Đã lưu kết quả {self.mode} vào '{base}.*'.")